@@ -4,6 +4,7 @@ from localvars import *
 from Core.mailer import Mailer
 from Core.fileManager import FileManager
 from Core.monitorManager import MonitorManager
+from Core.alertManager import AlertManager
 
 from GUI.collapsibleBox import CollapsibleBox
 from GUI.monitorWidget import MonitorWidget
@@ -30,8 +31,10 @@ class BlueforsMonitor(QtWidgets.QWidget):
         self.fileManager.processedChanges.connect(self.processChangesCallback)
         self.monitorManager = MonitorManager(self)
         self.monitorSignal.connect(self.monitorSignalCallback) # When a monitor is toggled
+        self.monitorChange.connect(self.monitorChangeCallback)
         #self.monitorChange.connect(self.propagateMonitorChange)
         self.mailer = Mailer(RECIPIENTS)
+        self.alertManager = AlertManager(self.monitorManager, self.mailer)
         self.values = self.fileManager.dumpData()
 
         if SEND_TEST_EMAIL_ON_LAUNCH:
@@ -39,6 +42,7 @@ class BlueforsMonitor(QtWidgets.QWidget):
 
         self.collapsableBoxes = {}
         self.allMonitors = {}
+        self.monitorNames = set()  # Ids of the monitors set from a MonitorWidget
 
 
         """
@@ -58,11 +62,12 @@ class BlueforsMonitor(QtWidgets.QWidget):
     def init_ui(self):
 
         justify = {ch_type:0 for ch_type in MONITOR_CHANNELS.keys()}
+        latest = {} # Newest sample of every channel, the stores keep it so this does not depend on the history length
 
         for ch_type, channels in MONITOR_CHANNELS.items():
             for channel in channels:
                 try:
-                    t, value = sorted(self.values[channel], key=lambda x: x[0])[-1]
+                    t, value = latest[channel] = self.values[channel].latest()
                 except Exception as e:
                     logging.error(f"Encountered an error while trying to find last values: {str(e)}")
                     t, value = 0, None
@@ -81,7 +86,7 @@ class BlueforsMonitor(QtWidgets.QWidget):
                 self.allMonitors[channel] = {} # Can be overwritten
                 #print(self.values.keys())
                 try:
-                    t, value = sorted(self.values[channel], key=lambda x:x[0])[-1]
+                    t, value = latest[channel]
                 except Exception as e:
                     logging.error(f"Encountered an error while trying to find last values: {str(e)}")
                     t, value = 0, None
@@ -101,6 +106,7 @@ class BlueforsMonitor(QtWidgets.QWidget):
                         mw.changeValue(t, v)
                         layout.addWidget(mw)
                         self.allMonitors[channel][subchannel] = mw
+                        self.monitorNames.add(ch)
                 else:
                     mw = MonitorWidget(
                         name=channel,
@@ -114,6 +120,7 @@ class BlueforsMonitor(QtWidgets.QWidget):
                     mw.changeValue(t, value)
                     layout.addWidget(mw)
                     self.allMonitors[channel] = mw
+                    self.monitorNames.add(channel)
 
             self.collapsableBoxes[ch_type].setContentLayout(layout)
         self.main_layout = QtWidgets.QVBoxLayout()
@@ -124,6 +131,15 @@ class BlueforsMonitor(QtWidgets.QWidget):
         #self.scroll_widget.setMinimumSize(self.main_layout.sizeHint())
         #self.scroll_widget.setLayout(self.main_layout)
 
+    def monitorChangeCallback(self, obj):
+        """
+        Extra monitors of a channel have no MonitorWidget of their own, they are passed on as they are.
+        The MonitorWidgets handle the others
+        """
+        if obj['monitor'] in self.monitorNames:
+            return
+        self.monitorSignal.emit(obj)
+
     def init_threads(self):
         self.fileManager.start()
 
@@ -171,16 +187,8 @@ class BlueforsMonitor(QtWidgets.QWidget):
 
     def checkMonitors(self, obj):
         vals = self.monitorManager.checkMonitors(obj)
-        triggered = (self.monitorManager.WhatMonitorsTriggered(vals))
-        triggered_data = self.monitorManager.triggeredMonitorInfo(obj, triggered)
-        if len(vals.items()) and len(triggered):
-            logging.info(f"Alerts triggered: {', '.join([':'.join(x) if type(x) != str else x for x in triggered])}")
-        #if len(vals.items()):
-        #    print(vals)
-        if len(triggered) > 0:
-            print(f"Alerts triggered: {', '.join([':'.join(x) if type(x) != str else x for x in triggered])}")
-            #print(triggered_data)
-            self.mailer.send_alert(triggered_data, self.fileManager.currentStatus())
+        # Only alerts that start, escalate, need a reminder or clear are emailed
+        self.alertManager.process(obj, vals, self.fileManager.currentStatus)
 
         #print(self.fileManager.mostRecentChanges())
         #print(self.fileManager.currentStatus())
@@ -193,11 +201,11 @@ class BlueforsMonitor(QtWidgets.QWidget):
         """
 
         if obj['active']:
-            self.monitorManager.addMonitor(channel=obj['channel'], subchannel=obj['subchannel'], type=obj['type'], values=obj['values'], variables=obj['variables'])
+            self.monitorManager.addMonitor(channel=obj['channel'], subchannel=obj['subchannel'], type=obj['type'], values=obj['values'], variables=obj['variables'], monitor_id=obj['monitor'], severity=obj.get('severity', DEFAULT_MONITOR_SEVERITY))
             logging.info(f"Monitor {obj['monitor']} activated, (channel={obj['channel']}, subchannel={obj['subchannel']}, type={obj['type']}, values={obj['values']}, variables={obj['variables']})")
             print(f"Monitor {obj['monitor']} activated")
         else:
-            self.monitorManager.removeMonitor(channel=obj['channel'], subchannel=obj['subchannel'])
+            self.monitorManager.removeMonitor(channel=obj['channel'], subchannel=obj['subchannel'], monitor_id=obj['monitor'])
             logging.info(f"Monitor {obj['monitor']} deactivated, (channel={obj['channel']}, subchannel={obj['subchannel']}, type={obj['type']}, values={obj['values']}, variables={obj['variables']})")
             print(f"Monitor {obj['monitor']} deactivated")
 
@@ -0,0 +1,168 @@
+"""
+Alert state of every active monitor, so emails are only sent when an alert starts, escalates, is still going after
+ALERT_RENOTIFY_SECONDS or clears, instead of on every batch a monitor is triggered in
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+import time
+import logger
+from Core.monitorManager import signal_name
+
+logging = logger.Logger(__file__)
+
+OK = 'ok'
+PENDING = 'pending'  # Triggered, waiting ALERT_DEBOUNCE_SECONDS before alerting
+FIRING = 'firing'
+
+TRIGGERED = 'triggered'
+ESCALATED = 'escalated'
+RENOTIFY = 'renotify'
+CLEARED = 'cleared'
+
+
+class AlertState:
+    """
+    ok -> pending once the monitor triggers, pending -> firing once it stayed triggered for the debounce time,
+    firing -> ok once it stayed quiet for the clear time. While firing, range monitors are checked against thresholds
+    moved out by ALERT_CLEAR_MARGIN (see hold). Together with the different trigger and clear times that is the
+    hysteresis: a value wavering around a threshold keeps one alert firing instead of starting a new one every time it crosses
+    """
+    def __init__(self, monitor, severity):
+        self.monitor = monitor  # An edited monitor is a new object, and starts over with a new state
+        holding = getattr(monitor, 'holding', None)
+        self.hold = holding(ALERT_CLEAR_MARGIN) if holding and ALERT_CLEAR_MARGIN > 0 else None  # Checked while firing
+        self.state = OK
+        self.triggered = False  # Last result of the monitor, kept while its channel has no new samples
+        self.configured_severity = severity
+        self.severity = severity  # Raised by escalations, back to the configured one when the alert clears
+        self.since = None  # When the monitor started triggering
+        self.quiet_since = None  # When a firing monitor stopped triggering
+        self.fired_at = None
+        self.notified_at = None
+        self.escalations = 0
+
+    def update(self, triggered, now):
+        """
+        :param triggered: monitor result, None if its channel had no new samples
+        :return: TRIGGERED, ESCALATED, RENOTIFY, CLEARED or None
+        """
+        if triggered is not None:
+            self.triggered = triggered
+        if self.state == OK:
+            if not self.triggered:
+                return None
+            self.state, self.since = PENDING, now
+        if self.state == PENDING:
+            if not self.triggered:
+                self.state, self.since = OK, None
+                return None
+            if now - self.since < ALERT_DEBOUNCE_SECONDS:
+                return None
+            self.state, self.fired_at, self.notified_at, self.quiet_since = FIRING, now, now, None
+            return TRIGGERED
+
+        if not self.triggered:
+            if self.quiet_since is None:
+                self.quiet_since = now
+            if now - self.quiet_since >= ALERT_CLEAR_SECONDS:
+                self.state, self.since, self.quiet_since = OK, None, None
+                self.severity, self.escalations = self.configured_severity, 0
+                return CLEARED
+            return None
+        self.quiet_since = None
+        severity = MONITOR_SEVERITIES.index(self.severity)
+        if ALERT_ESCALATION_SECONDS > 0 and severity + 1 < len(MONITOR_SEVERITIES) \
+                and now - self.fired_at >= ALERT_ESCALATION_SECONDS * (self.escalations + 1):
+            self.severity = MONITOR_SEVERITIES[severity + 1]
+            self.escalations += 1
+            self.notified_at = now
+            return ESCALATED
+        if ALERT_RENOTIFY_SECONDS > 0 and now - self.notified_at >= ALERT_RENOTIFY_SECONDS:
+            self.notified_at = now
+            return RENOTIFY
+        return None
+
+
+class AlertManager:
+    def __init__(self, monitorManager, mailer):
+        self.monitorManager = monitorManager
+        self.mailer = mailer
+        self.alerts = {}  # monitor id -> AlertState
+
+    def update(self, monitorCheckRet, now=None, signaledValues=None):
+        """
+        Steps the alert of every active monitor, including those whose channel had no new samples so pending,
+        clearing and re-notified alerts move on with time
+
+        :param monitorCheckRet: {monitor id: triggered} from MonitorManager.checkMonitors
+        :param signaledValues: {channel: SampleBatch} the monitors were checked against, to check firing alerts
+                               against their hold monitor. Without it firing alerts clear on the monitor's own result
+        :return: {monitor id: TRIGGERED, ESCALATED, RENOTIFY or CLEARED} for the alerts that changed
+        """
+        now = time.time() if now is None else now
+        severities = self.monitorManager.severities
+        for monitor_id in [m for m in self.alerts if m not in severities]:
+            self.alerts.pop(monitor_id) # Monitor removed
+        transitions = {}
+        for monitor_id, severity in severities.items():
+            alert = self.alerts.get(monitor_id)
+            monitor = self.monitorManager.getMonitor(monitor_id)
+            if alert is None or alert.monitor is not monitor:
+                alert = self.alerts[monitor_id] = AlertState(monitor, severity)
+            triggered = monitorCheckRet.get(monitor_id)
+            if alert.state == FIRING and alert.hold is not None and signaledValues is not None:
+                held = self.checkHold(monitor_id, alert.hold, signaledValues)
+                if held is not None:
+                    triggered = held
+            transition = alert.update(triggered, now)
+            if transition is not None:
+                transitions[monitor_id] = transition
+        return transitions
+
+    def checkHold(self, monitor_id, hold, signaledValues):
+        """
+        :return: True if a new value of the monitor's channel is within the margin of its thresholds, None without new values
+        """
+        channel, subchannel = self.monitorManager.signals[monitor_id]
+        batch = signaledValues.get(channel)
+        if batch is None:
+            return None
+        column = batch.values if subchannel is None else batch.column(subchannel)
+        values = [v for v in column if (type(v) == float or type(v) == int) and v == v]
+        if not len(values):
+            return None
+        return any(map(hold.checkValue, values))
+
+    def describe(self, monitor_id):
+        channel, subchannel = self.monitorManager.signals[monitor_id]
+        return f"{signal_name(channel, subchannel)} is no longer {self.monitorManager.getMonitor(monitor_id)} ({monitor_id})"
+
+    def firing(self):
+        """
+        :return: ids of the monitors with an alert going on
+        """
+        return [monitor_id for monitor_id, alert in self.alerts.items() if alert.state == FIRING]
+
+    def process(self, signaledValues, monitorCheckRet, currentStatus, now=None):
+        """
+        Updates the alerts and emails the changes, if any
+
+        :param signaledValues: {channel: SampleBatch} the monitors were checked against
+        :param monitorCheckRet: {monitor id: triggered} from MonitorManager.checkMonitors
+        :param currentStatus: function returning the latest values of every channel for the email, only called to send one
+        :return: {monitor id: transition} as returned by update
+        """
+        transitions = self.update(monitorCheckRet, now, signaledValues)
+        if not transitions:
+            return transitions
+        for kind in (TRIGGERED, ESCALATED, RENOTIFY, CLEARED):
+            ids = [monitor_id for monitor_id, transition in transitions.items() if transition == kind]
+            if len(ids):
+                logging.info(f"Alerts {kind}: {', '.join(ids)}")
+        alerting = [monitor_id for monitor_id, transition in transitions.items() if transition != CLEARED]
+        cleared = [monitor_id for monitor_id, transition in transitions.items() if transition == CLEARED]
+        severities = {monitor_id: alert.severity for monitor_id, alert in self.alerts.items()}
+        triggered_data = self.monitorManager.triggeredMonitorInfo(signaledValues, alerting, severities)
+        resolved = [self.describe(monitor_id) for monitor_id in cleared]
+        self.mailer.send_alert(triggered_data, currentStatus(), resolved=resolved)
+        return transitions
@@ -0,0 +1,58 @@
+"""
+Thread safe queue of file changes where repeated changes of the same file collapse into one pending read
+"""
+import threading
+
+
+class CoalescingChangeQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # (channel, date) -> change, in order of first arrival
+        self._event = threading.Event()
+        self.received = 0
+        self.coalesced = 0
+
+    def put(self, change, channel, date):
+        """
+        Adds a change, unless the same file already has one pending. Safe to call from watchdog threads
+        """
+        with self._lock:
+            self.received += 1
+            key = (channel, date)
+            if key in self._pending:
+                self.coalesced += 1
+                if change == 'created': # Keep the stronger of the two
+                    self._pending[key] = change
+            else:
+                self._pending[key] = change
+            self._event.set()
+
+    def drain(self):
+        """
+        Takes every pending change at once
+
+        :return: list of (change, channel, date)
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._event.clear()
+        return [(change, channel, date) for (channel, date), change in pending.items()]
+
+    def wait(self, timeout=None):
+        """
+        Blocks until a change is pending or the timeout passes
+
+        :return: True if a change is pending
+        """
+        return self._event.wait(timeout)
+
+    def wake(self):
+        """
+        Releases anyone blocked in wait, e.g. to stop
+        """
+        self._event.set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
@@ -0,0 +1,119 @@
+"""
+Column type schemas for log channels, so values are converted with a known converter instead of guessing
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+
+
+def infer_value(val):
+    """
+    converts a single raw value to int, then float, falling back to the raw string
+    """
+    try:
+        try:
+            return int(val)
+        except ValueError:
+            return float(val)
+    except ValueError:
+        return val
+
+def _to_float(val):
+    f = float(val)
+    if f.is_integer() and '.' not in val and 'e' not in val and 'E' not in val:
+        return infer_value(val)  # could be an int literal, which infer_value keeps as an int
+    return f
+
+_NUMERIC_PREFIX = frozenset('0123456789+-. \t')
+_FLOAT_WORDS = frozenset(['nan', 'inf', 'infinity'])
+
+def _to_str(val):
+    c = val[:1]
+    if c in _NUMERIC_PREFIX or c.isdigit() or c.isspace() or (c in 'nNiI' and val.rstrip().lower() in _FLOAT_WORDS):
+        return infer_value(val)  # looks numeric, let inference decide
+    return val
+
+# Every converter returns exactly what infer_value would, they only skip the attempts that are known to fail
+COLUMN_CONVERTERS = {
+    'int': int,
+    'float': _to_float,
+    'str': _to_str,
+}
+
+KIND_ORDER = ['int', 'float', 'str']
+
+def kind_of(value):
+    if type(value) == int:
+        return 'int'
+    if type(value) == float:
+        return 'float'
+    return 'str'
+
+
+class ChannelSchema:
+    """
+    Column kinds of one channel, learned from the first row of each row width or declared in CHANNEL_COLUMN_TYPES.
+    A declared list shorter than the row is repeated (e.g. ['str', 'float'] for key/value channels)
+    """
+    def __init__(self, channel, declared=None):
+        self.channel = channel
+        self.declared = list(declared) if declared else None
+        self.kinds = {}  # row width -> list of kinds
+        self.converters = {}  # row width -> list of converters
+        self.mismatches = 0
+
+    def get_kinds(self, width):
+        if width not in self.kinds and self.declared:
+            self.set_kinds(width, [self.declared[i % len(self.declared)] for i in range(width)])
+        return self.kinds.get(width)
+
+    def set_kinds(self, width, kinds):
+        self.kinds[width] = kinds
+        self.converters[width] = [COLUMN_CONVERTERS[k] for k in kinds]
+
+    def learn(self, values):
+        """
+        learns (or widens int -> float -> str) the column kinds from already converted values
+        """
+        width = len(values)
+        kinds = [kind_of(v) for v in values]
+        if self.get_kinds(width) is not None:
+            kinds = [max(a, b, key=KIND_ORDER.index) for a, b in zip(self.kinds[width], kinds)]
+        self.set_kinds(width, kinds)
+
+    def convert(self, raw_values):
+        """
+        converts raw values of one row, falling back to inference (and widening the schema) if the row does not match
+
+        :param raw_values: raw string values of a row, without the timestamp
+        :return: list of converted values
+        """
+        converters = self.converters.get(len(raw_values))
+        if converters is None and self.get_kinds(len(raw_values)) is not None:
+            converters = self.converters[len(raw_values)]
+        if converters is not None:
+            try:
+                return [f(v) for f, v in zip(converters, raw_values)]
+            except ValueError:
+                self.mismatches += 1
+        values = [infer_value(v) for v in raw_values]
+        self.learn(values)
+        return values
+
+
+class SchemaRegistry:
+    def __init__(self, declared = CHANNEL_COLUMN_TYPES):
+        self.declared = declared
+        self.schemas = {}
+
+    def get(self, channel):
+        try:
+            return self.schemas[channel]
+        except KeyError:
+            schema = self.schemas[channel] = ChannelSchema(channel, self.declared.get(channel))
+            return schema
+
+    def clear(self):
+        self.schemas = {}
+
+
+SCHEMA_REGISTRY = SchemaRegistry()
@@ -0,0 +1,64 @@
+"""
+Sidecar file remembering how far every log channel was read, so a restart can resume tailing instead of re-parsing
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+import os
+import json
+import logger
+
+logging = logger.Logger(__file__)
+
+
+class CheckpointStore:
+    def __init__(self, log_path = LOG_PATH, fname = CHECKPOINT_FILE):
+        self.log_path = log_path
+        self.fname = fname
+        self.checkpoints = {}
+
+    def load(self):
+        """
+        Loads checkpoints from disk, ignoring them if they were written for another log path
+        """
+        self.checkpoints = {}
+        if not self.fname or not os.path.exists(self.fname):
+            return self.checkpoints
+        try:
+            with open(self.fname, 'r') as f:
+                contents = json.load(f)
+        except Exception as e:
+            logging.warning(f"Cannot load read checkpoints from {self.fname}: {str(e)}")
+            return self.checkpoints
+        if contents.get('log_path') != os.path.abspath(self.log_path):
+            logging.info(f"Read checkpoints in {self.fname} are for another log path, ignoring them")
+            return self.checkpoints
+        self.checkpoints = contents.get('channels', {})
+        return self.checkpoints
+
+    def save(self):
+        if not self.fname:
+            return
+        temp = f"{self.fname}.tmp"
+        try:
+            with open(temp, 'w') as f:
+                json.dump({'log_path': os.path.abspath(self.log_path), 'channels': self.checkpoints}, f)
+            os.replace(temp, self.fname) # Never leave a half written checkpoint file behind
+        except Exception as e:
+            logging.error(f"Cannot save read checkpoints to {self.fname}: {str(e)}")
+
+    def record(self, logChannel):
+        checkpoint = logChannel.checkpoint()
+        if checkpoint is not None:
+            self.checkpoints[logChannel.channel] = checkpoint
+
+    def restore(self, logChannel):
+        """
+        Restores the channel from its checkpoint if it still describes the currently opened file
+
+        :param logChannel: opened LogChannel
+        :return: True if restored, False if the file has to be read from the start
+        """
+        checkpoint = self.checkpoints.get(logChannel.channel)
+        if checkpoint is None:
+            return False
+        return logChannel.restore(checkpoint)
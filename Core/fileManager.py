@@ -5,93 +5,51 @@ import localvars
 localvars.load_globals(localvars,globals())
 
 from Core.fileMonitor import *
+from Core.checkpointStore import CheckpointStore
+from Core.changeQueue import CoalescingChangeQueue
+from Core.sampleBatch import SampleBatch
+from Core.sampleStore import ChannelStore
+from Core.logChannel import LogChannel, load_log_channel
+from Core.logArchive import LogArchive
+from Core.logQuery import LogQuery
+from Core.rollups import RollupStore
 
 from PyQt5 import QtCore
-
-class LogChannel:
-    def __init__(self, channel, log_path=LOG_PATH):
-        self.fd = None
-        self.fname = None
-        self.date = None
-        self.channel = channel
-
-        self.labels = []
-        self.data = []
-        self.last_data = {}
-        self.last_time = None
-
-        self.log_path = log_path
-
-
-
-    def update_path_information(self, date = None):
-        if date:
-            self.date = date
-        if self.channel in CHANNELS_WITH_UNDERSCORE:
-            self.fname = f'{self.channel}_{self.date}.log'
-        else:
-            self.fname = f'{self.channel} {self.date}.log'
-
-
-        return self.fname
-
-    def open(self, date = None):
-        if date:
-            self.date = date
-        self.close()
-        self.date = self.date
-        self.update_path_information(self.date)
-        self.fd = open(os.path.join(self.log_path, self.date, self.fname), 'r')
-
-
-    def update(self):
-        if not self.fd:
-            return None, None
-        flines = [l.strip(' \t\r\n').split(',') for l in self.fd.readlines()]# if l[-1] == '\n']
-
-        if len(flines) == 0:
-            return None, None
-        processed = process_log_file_lines(flines, channel=self.channel, date=self.date)
-        data, labels = process_log_file_rows(processed, channel=self.channel, date=self.date)
-        self.labels = labels
-        self.data += (list(data.items()))
-        if len(self.data) > MAXIMUM_DATAPOINT_HISTORY:
-            self.data = self.data[-MAXIMUM_DATAPOINT_HISTORY:]
-
-        last_time, last_data = get_last_entry(data, labels)
-        if last_time is None or last_data is None: # This might prevent the None,None error
-            return None, None
-        self.last_time = last_time
-        self.last_data = last_data
-        return self.last_time, self.last_data
-
-    def close(self):
-        if self.fd:
-            self.fd.close()
-            self.fd = None
-
-    def __del__(self):
-        self.close()
+import threading
+import queue
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
 class FileManager(QThread):
     processedChanges = QtCore.pyqtSignal(dict)
     allData = QtCore.pyqtSignal(dict)
-    def __init__(self, log_path = LOG_PATH):
+    loadProgress = QtCore.pyqtSignal(int, int) # channels loaded, total channels
+    loadFinished = QtCore.pyqtSignal()
+    def __init__(self, log_path = LOG_PATH, background_load = False):
         super().__init__()
         self.log_path = log_path
         self.logChannels = {}
         self.overseer = Overseer(log_path)
-        self.overseer.changeSignal.connect(self.changeDetected)
+        # File events only mark a file as pending, it is read once per cycle in run() no matter how many events came
+        self.changeQueue = CoalescingChangeQueue()
+        self.overseer.changeSignal.connect(self.changeQueue.put, QtCore.Qt.DirectConnection)
+        self.checkpoints = CheckpointStore(log_path)
+        self.checkpoints.load()
         self.latest_log_files = load_all_possible_log_files(log_path)
-        for channel, date in self.latest_log_files.items():
-            #print(channel, date)
-            if channel in CHANNEL_BLACKLIST:
-                continue
-            self.logChannels[channel] = LogChannel(channel, log_path)
-            self.logChannels[channel].open(date)
-            self.logChannels[channel].update()
-            self.logChannels[channel].close()
+        self.archive = LogArchive(log_path)
+        self.history = LogQuery(log_path, archive=self.archive)
+        self.rollups = RollupStore(log_path, archive=self.archive, history=self.history)
+        self.compactor = None
+
+        self.loaded = False
+        self.loader = None
+        self._stopLoading = False
+        self.backfilled = queue.Queue() # (channel, older samples) waiting to be merged in by the thread owning the stores
+        if not background_load:
+            self.loadChannels()
+            self.backfillChannels()
+            self.applyBackfill()
+            self.buildRollups()
 
         self.last_emitted_changes = {}
         self.most_recent_changes = {}
@@ -99,29 +57,227 @@ class FileManager(QThread):
         self.changes_read = {}
         self._isRunning = False
 
+    def startLoading(self):
+        """
+        Loads all channels in a background thread, loadFinished is emitted once done. Older history is backfilled after
+        """
+        self.loader = threading.Thread(target=self._loadAndBackfill, daemon=True)
+        self.loader.start()
+
+    def _loadAndBackfill(self):
+        self.loadChannels()
+        self.backfillChannels()
+        self.buildRollups()
+
+    def buildRollups(self):
+        """
+        Builds the rollup of the day every channel is tailing, so batches read from then on are counted into it.
+        Runs in the loader thread, batches read while a day is built are replayed into it by the RollupStore
+        """
+        for channel, logChannel in list(self.logChannels.items()):
+            if self._stopLoading:
+                return
+            try:
+                self.rollups.day(channel, logChannel.date)
+            except Exception as e:
+                logging.error(f"Could not build the rollup of {channel} {logChannel.date}: {str(e)}")
+
+    def backfillChannels(self):
+        """
+        Reads the last BACKFILL_HOURS of every channel, older than the first sample in its store, from the date folders
+        before the day it is tailing, at most what its store still has room for. Channels resumed from a checkpoint
+        only hold a short tail of that day, their day is read again first. Runs in the loader thread, the samples are
+        merged by applyBackfill
+        """
+        if not BACKFILL_HOURS or not self.loaded:
+            return
+        now = time.time()
+        cutoff = now - BACKFILL_HOURS * 3600
+        dates = self.history.dates_between(cutoff, now)
+        count = 0
+        for channel, logChannel in list(self.logChannels.items()):
+            room = logChannel.data.capacity - len(logChannel.data)
+            if room <= 0:
+                continue
+            first = logChannel.data[0][0] if len(logChannel.data) else now
+            samples = []
+            backfill_dates = {d for d in dates if d < logChannel.date}
+            if logChannel.resumed:
+                backfill_dates.add(logChannel.date)
+            for date in sorted(backfill_dates, reverse=True): # Newest first, until the store is full
+                if self._stopLoading:
+                    return
+                if room <= len(samples):
+                    break
+                try:
+                    # The tailed day is still growing, a cached parse of it would be stale at once
+                    data, labels = self.archive.read(channel, date, use_cache=date != logChannel.date)
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    logging.error(f"Could not backfill {channel} {date}: {str(e)}")
+                    continue
+                day = [(t, v) for t, v in data.items() if cutoff <= t < first]
+                samples = day + samples
+            if len(samples):
+                self.backfilled.put((channel, samples[-room:]))
+                count += len(samples[-room:])
+        self.changeQueue.wake()
+        logging.info(f"Backfilled {count} samples from the last {BACKFILL_HOURS} hours")
+
+    def applyBackfill(self):
+        """
+        Puts backfilled samples in front of what the channels read since. Called from the thread that updates them
+        """
+        while True:
+            try:
+                channel, samples = self.backfilled.get_nowait()
+            except queue.Empty:
+                return
+            self.logChannels[channel].data.prepend(samples) # In place, the GUI holds the stores from dumpData
+
+    def startCompacting(self):
+        """
+        Archives closed days in a background thread, unless a pass is already running
+        """
+        if not ARCHIVE_PATH or (self.compactor and self.compactor.is_alive()):
+            return
+        self.compactor = threading.Thread(target=self.archive.compact, kwargs={'should_stop': lambda: not self._isRunning}, daemon=True)
+        self.compactor.start()
+
+    def loadChannels(self):
+        """
+        Loads the latest file of every channel. Channels resuming from a checkpoint (or with small files) are read
+        directly, the ones with more than LOAD_PARALLEL_MIN_BYTES left to parse are spread over a process pool
+        """
+        channels = {ch: date for ch, date in self.latest_log_files.items() if ch not in CHANNEL_BLACKLIST}
+        total = len(channels)
+        pending = []
+        for channel, date in channels.items():
+            if self._stopLoading:
+                return
+            logChannel = LogChannel(channel, self.log_path)
+            try:
+                logChannel.open(date)
+                if not self.checkpoints.restore(logChannel):
+                    logging.debug(f"No usable read checkpoint for {channel}, reading {date} from the start")
+                remaining = os.fstat(logChannel.fd.fileno()).st_size - logChannel.offset
+                logChannel.close()
+                if remaining > LOAD_PARALLEL_MIN_BYTES and LOAD_WORKERS != 1:
+                    pending.append(logChannel)
+                    continue
+                self.logChannels[channel] = load_log_channel(logChannel)
+            except Exception as e:
+                logging.error(f"Could not load {channel} {date}: {str(e)}")
+            self.loadProgress.emit(len(self.logChannels), total)
+
+        if len(pending):
+            self._loadInPool(pending, total)
+
+        self.loaded = True
+        self.loadFinished.emit()
+
+    def _loadInPool(self, logChannels, total):
+        try:
+            executor = ProcessPoolExecutor(max_workers=min(LOAD_WORKERS or os.cpu_count() or 1, len(logChannels)))
+        except Exception as e:
+            logging.warning(f"Cannot start loader processes, loading in this thread: {str(e)}")
+            executor = None
+        futures = {executor.submit(load_log_channel, lc): lc for lc in logChannels} if executor else {}
+        try:
+            for future in as_completed(futures):
+                if self._stopLoading:
+                    break
+                logChannel = futures[future]
+                try:
+                    self.logChannels[logChannel.channel] = future.result()
+                except Exception as e:
+                    logging.warning(f"Loader process failed for {logChannel.channel}, loading in this thread: {str(e)}")
+                    continue
+                self.loadProgress.emit(len(self.logChannels), total)
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        for logChannel in logChannels: # Whatever the pool could not load
+            if self._stopLoading:
+                return
+            if logChannel.channel in self.logChannels:
+                continue
+            try:
+                self.logChannels[logChannel.channel] = load_log_channel(logChannel)
+            except Exception as e:
+                logging.error(f"Could not load {logChannel.channel} {logChannel.date}: {str(e)}")
+            self.loadProgress.emit(len(self.logChannels), total)
+
     def emitData(self):
         self.allData.emit(self.dumpData())
 
     def dumpData(self):
         return {ch:lc.data for ch,lc in self.logChannels.items()}
 
+    def saveCheckpoints(self):
+        for channel, logChannel in list(self.logChannels.items()):
+            self.checkpoints.record(logChannel)
+        self.checkpoints.save()
+
+    def readPendingChanges(self):
+        """
+        Reads every file with a pending change into changes_read
+
+        :return: number of files read
+        """
+        pending = self.changeQueue.drain()
+        for change, channel, date in pending:
+            self.changeDetected(change, channel, date)
+        return len(pending)
+
+    def collectBatch(self):
+        """
+        Reads changes until the write burst settles: CHANGE_QUIET_PERIOD without new changes,
+        CHANGE_MAX_LATENCY since the first one or CHANGE_MAX_BATCH file reads
+        """
+        start = time.monotonic()
+        reads = self.readPendingChanges()
+        while self._isRunning and reads < CHANGE_MAX_BATCH:
+            remaining = start + CHANGE_MAX_LATENCY - time.monotonic()
+            if remaining <= 0 or not self.changeQueue.wait(min(CHANGE_QUIET_PERIOD, remaining)):
+                break
+            reads += self.readPendingChanges()
+
     def run(self):
         self._isRunning = True
         self.overseer.start()
+        self.startCompacting()
+        last_checkpoint = time.monotonic()
         while self._isRunning:
-            logging.debug("Looping")
+            if self.changeQueue.wait(max(last_checkpoint + CHECKPOINT_INTERVAL - time.monotonic(), 0)):
+                self.collectBatch()
+            self.applyBackfill()
+            # Only this thread touches changes_read, so it can be swapped out and emitted as is
             if len(self.changes_read.keys()) > 0:
                 logging.debug("Pending changes emitting")
                 self.last_emitted_changes = self.changes_read
                 self.changes_read = {}
                 self.processedChanges.emit(self.last_emitted_changes)
                 self.most_recent_changes.update(self.last_emitted_changes)
-            time.sleep(CHANGE_PROCESS_CHECK)
+            if time.monotonic() - last_checkpoint > CHECKPOINT_INTERVAL:
+                self.saveCheckpoints()
+                self.startCompacting() # Picks up the day that just closed after midnight
+                last_checkpoint = time.monotonic()
+        self.saveCheckpoints() # Last one, once no read moves the offsets anymore
 
     def stop(self):
         self._isRunning = False
+        self.changeQueue.wake()
+        self._stopLoading = True
+        if self.loader:
+            self.loader.join()
+        if self.compactor:
+            self.compactor.join()
         self.overseer.stop()
         self.overseer.wait()
+        if not self.isRunning():
+            self.saveCheckpoints() # Never started, otherwise run saves them on its way out
 
     def __del__(self):
         for channel, logChannel in self.logChannels.items():
@@ -135,12 +291,25 @@ class FileManager(QThread):
         if self.logChannels[channel].date != date:
             #self.logChannels[channel].update_path_information(date)
             self.logChannels[channel].open(date) # We need to actually open the new file to read it
+            self.rollups.start(channel, date) # Read from its start, every sample goes through add
         if not self.logChannels[channel].fd:
             self.logChannels[channel].open()
-        time, data = self.logChannels[channel].update()
+        batch = self.logChannels[channel].update()
+        if not batch: # Nothing new, an earlier read already picked it up
+            return
+        self.rollups.add(channel, date, batch)
         if channel not in self.changes_read:
-            self.changes_read[channel] = {}
-        self.changes_read[channel].update({time:data})
+            self.changes_read[channel] = batch
+        else:
+            self.changes_read[channel].extend(batch)
+
+    def latest(self, channel, subchannel = None):
+        """
+        :return: (time, value) of the newest sample of a channel (or of one of its subchannels), in O(1)
+        """
+        if channel not in self.logChannels:
+            return None, None
+        return self.logChannels[channel].data.latest(subchannel)
 
     def currentStatus(self):
         return {ch: (lc.last_time, lc.last_data) for ch, lc in self.logChannels.items()}
@@ -7,7 +7,10 @@ import logger
 logging = logger.Logger(__file__)
 
 import time
+import threading
+from datetime import timedelta
 
+from PyQt5 import QtCore
 from PyQt5.QtCore import QThread, pyqtSignal, QObject
 
 
@@ -21,58 +24,118 @@ class LogFileWatchdog(FileSystemEventHandler, QObject):
         super().__init__()
 
 
-    def on_created(self, event):
+    @staticmethod
+    def parseLogFileEvent(event):
+        """
+        :return: channel, date of the log file in the event, None, None if it is not a log file
+        """
         fname = event.src_path.split(os.sep)[-1]
+        if event.is_directory or not fname.endswith('.log'):
+            return None, None
         channel = fname[:-len(SUFFIX_FORMAT)].strip(' _')
         date = fname[-len(SUFFIX_FORMAT):][:-4] # to get rid of the .log extension
-        self.changeSignal.emit('created', channel, date)
+        return channel, date
+
+    def on_created(self, event):
+        channel, date = self.parseLogFileEvent(event)
+        if channel:
+            self.changeSignal.emit('created', channel, date)
 
     def on_modified(self, event):
-        fname = event.src_path.split(os.sep)[-1]
-        channel = fname[:-len(SUFFIX_FORMAT)].strip(' _')
-        date = fname[-len(SUFFIX_FORMAT):][:-4]  # to get rid of the .log extension
-        self.changeSignal.emit('modified', channel, date)
+        channel, date = self.parseLogFileEvent(event)
+        if channel:
+            self.changeSignal.emit('modified', channel, date)
+
 
 
+class LogRootWatchdog(FileSystemEventHandler, QObject):
+    """
+    Watches the log root (non recursively) for new date folders
+    """
+    folderCreated = pyqtSignal(str)
+    def __init__(self):
+        super().__init__()
+
+    def on_created(self, event):
+        if not event.is_directory:
+            return
+        folder = event.src_path.rstrip(os.sep).split(os.sep)[-1]
+        try:
+            datetime.strptime(folder, DATE_FORMAT)
+        except ValueError:
+            return
+        self.folderCreated.emit(folder)
+
 
 class Overseer(QThread):
+    """
+    Subscribes to the newest date folder and moves to the next one as soon as it is created, or at midnight.
+    Sleeps until one of those happens instead of polling
+    """
     changeSignal = pyqtSignal(str, str, str)
     def __init__(self, log_path = LOG_PATH):
         super().__init__()
-        self.date = datetime.now().strftime(DATE_FORMAT)
-        self.date = '24-06-10'
+        self.date = None
         self.log_path = log_path
         self.logFileWatchdog = LogFileWatchdog()
-        self.logFileWatchdog.changeSignal.connect(self.changeSignal)
+        self.logFileWatchdog.changeSignal.connect(self.changeSignal, QtCore.Qt.DirectConnection) # Stay in the watchdog thread
+        self.logRootWatchdog = LogRootWatchdog()
+        self.logRootWatchdog.folderCreated.connect(self.folderCreated, QtCore.Qt.DirectConnection)
 
         self.observer = Observer()
         self.schedule = None
         self._isRunning = False
+        self._wakeup = threading.Event()
+
+    def folderCreated(self, folder):
+        logging.debug(f"Folder {folder} created")
+        self._wakeup.set()
+
+    def newestFolder(self):
+        folders = load_calibration_dates(log_path=self.log_path, omit_empty_directories=False, newer_than=self.date)
+        return folders[-1] if len(folders) else None
+
+    def subscribe(self, folder):
+        """
+        Moves the file watch to a date folder. On a rollover, files written before the watch was in place are reported
+        """
+        rollover = self.date is not None
+        if rollover:
+            logging.warning(f"Date changed to {folder}")
+        self.date = folder
+        if self.schedule is not None:
+            self.observer.unschedule(self.schedule)
+        self.schedule = self.observer.schedule(self.logFileWatchdog, os.path.join(self.log_path, self.date), recursive=False)
+        logging.debug(f"Schedule: {str(self.schedule)}")
+        if rollover:
+            for channel in list_log_files(self.log_path, folder):
+                self.changeSignal.emit('created', channel, folder)
+
+    @staticmethod
+    def secondsUntilMidnight():
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return max((midnight - now).total_seconds(), 0) + MIDNIGHT_ROLLOVER_DELAY
 
     def run(self):
         self._isRunning = True
-        if os.path.exists(os.path.join(self.log_path, self.date)):
-            self.schedule = self.observer.schedule(self.logFileWatchdog, os.path.join(self.log_path, self.date), recursive=False)
-            logging.debug(f"Schedule: {str(self.schedule)}")
+        self.observer.schedule(self.logRootWatchdog, self.log_path, recursive=False)
         self.observer.start()
         while self._isRunning:
-            current_date = datetime.now().strftime(DATE_FORMAT)
-            if current_date != self.date or self.schedule is None:
-                if not os.path.exists(os.path.join(self.log_path, current_date)):
-                    logging.warning(f"Date changed to {current_date} but folder does not exist yet, trying again later")
-                    time.sleep(2)
-                    continue
-                logging.warning(f"Date changed to {current_date}")
-                self.date = current_date
-                self.observer.unschedule_all()
-                self.schedule = self.observer.schedule(self.logFileWatchdog, os.path.join(self.log_path, self.date), recursive=False)
-
-            time.sleep(1)
+            folder = self.newestFolder()
+            if folder is not None and folder != self.date:
+                self.subscribe(folder)
+            elif self.date is None:
+                logging.warning(f"No date folder in {self.log_path} yet, waiting for one to be created")
+            self._wakeup.wait(self.secondsUntilMidnight())
+            self._wakeup.clear()
 
     def stop(self):
         self._isRunning = False
+        self._wakeup.set()
         self.observer.stop()
-        self.observer.join()
+        if self.observer.is_alive(): # Not started if stopped before the initial load finished
+            self.observer.join()
 
 if __name__ == "__main__":
     from PyQt5.QtWidgets import QMainWindow, QTextEdit, QVBoxLayout, QWidget, QApplication
@@ -2,7 +2,12 @@
 import localvars
 localvars.load_globals(localvars, globals())
 import os
+import mmap
+from array import array
 from datetime import datetime
+from Core.timestampDecoder import get_timestamp_decoder
+from Core.channelSchema import infer_value, SCHEMA_REGISTRY
+from Core.parsedFileCache import ParsedFileCache
 
 class LogFile:
     def __init__(self, channel, date, data, labels, log_path = LOG_PATH):
@@ -30,6 +35,15 @@ class LogFile:
 
 
 
+_decode_timestamp = get_timestamp_decoder(TIMESTAMP_DECODER)
+
+def set_timestamp_decoder(name):
+    """
+    swaps the decoder used by every parser engine, see Core.timestampDecoder.TIMESTAMP_DECODERS
+    """
+    global _decode_timestamp
+    _decode_timestamp = get_timestamp_decoder(name)
+
 def process_log_file_lines(lines, channel, date):
     """
     process raw lines from the file into an array with a time stamp and converted values (int/float/etc)
@@ -40,38 +54,110 @@ def process_log_file_lines(lines, channel, date):
     :return: array of lines in proper formats
     """
     processed = []
+    schema = SCHEMA_REGISTRY.get(channel)
     for line in lines:
         try:
-            t = datetime.strptime(f'{line[0]} {line[1]}', '%d-%m-%y %H:%M:%S').timestamp()
+            t = _decode_timestamp(line[0], line[1])
             values = [t]
-            for val in line[2:]:
-                try:
-                    try:
-                        values.append(int(val))
-                    except ValueError:
-                        values.append(float(val))
-                except ValueError:
-                    values.append(val)
+            values += schema.convert(line[2:])
             processed.append(values)
-        except ValueError as e:
+        except (ValueError, IndexError) as e:
             print(f"Read error {date}/{channel}: {str(e)}")
     return processed
 
-def process_log_file_rows(processed, channel, date):
+def _convert_column(column, kind=None):
+    """
+    converts a whole column at once, only falling back to per value inference when the column has mixed types.
+    A known kind skips the conversions that are bound to fail
+
+    :param column: tuple of raw values
+    :param kind: column kind from the channel schema, if known
+    :return: list of converted values (identical to calling infer_value on each one), widest kind of the column
+    """
+    if kind != 'str' and kind != 'float':
+        try:
+            return [int(v) for v in column], 'int'
+        except ValueError:
+            pass
+    if kind != 'str':
+        try:
+            floats = [float(v) for v in column]
+        except ValueError:
+            pass
+        else:
+            # integral floats might have been written as ints, those must stay ints
+            return [infer_value(v) if f.is_integer() else f for v, f in zip(column, floats)], 'float'
+    # Mostly label columns (channel names, keys) which repeat the same few values all file long
+    inferred = {v: infer_value(v) for v in set(column)}
+    return [inferred[v] for v in column], 'str'
+
+def process_log_file_bulk(lines, channel, date):
     """
+    batched alternative to process_log_file_lines. Rows of the same width are transposed so every column
+    is converted in a single pass instead of trying int/float on each value of each row
 
+    :param lines: array of lines read directly from file
     :param channel: log file channel
+    :param date: date
+    :return: array of lines in proper formats, same as process_log_file_lines
+    """
+    widths = {}
+    for i, line in enumerate(lines):
+        widths.setdefault(len(line), []).append(i)
+
+    processed = [None] * len(lines)
+    schema = SCHEMA_REGISTRY.get(channel)
+    for width, indices in widths.items():
+        if width < 2:
+            for i in indices:
+                print(f"Read error {date}/{channel}: missing timestamp in {lines[i]}")
+            continue
+        columns = list(zip(*[lines[i] for i in indices]))
+        decode = _decode_timestamp
+        try:
+            times = [decode(d, t) for d, t in zip(columns[0], columns[1])]
+        except ValueError:
+            # At least one bad timestamp, redo this group row by row so only the bad ones are dropped
+            times = []
+            for d, t in zip(columns[0], columns[1]):
+                try:
+                    times.append(decode(d, t))
+                except ValueError as e:
+                    print(f"Read error {date}/{channel}: {str(e)}")
+                    times.append(None)
+        kinds = schema.get_kinds(width - 2) or [None] * (width - 2)
+        values, column_kinds = [], []
+        for column, kind in zip(columns[2:], kinds):
+            converted, kind = _convert_column(column, kind)
+            values.append(converted)
+            column_kinds.append(kind)
+        if column_kinds != kinds:
+            schema.set_kinds(width - 2, column_kinds)
+        for i, t, row in zip(indices, times, zip(*values) if values else [()] * len(indices)):
+            if t is not None:
+                processed[i] = [t, *row]
+
+    return [row for row in processed if row is not None]
+
+PARSER_ENGINES = {
+    'line': process_log_file_lines,
+    'bulk': process_log_file_bulk,
+}
+
+def iter_log_file_rows(processed, channel, date):
+    """
+    turns processed lines into (time, value) pairs depending on the kind of channel. Unlike
+    process_log_file_rows, rows sharing a timestamp are all kept
+
     :param processed: processed lines of the file
-    :return: {} processed rows
+    :param channel: log file channel
+    :return: generator of (time, value)
     """
-    data = {}
-    labels = []
     if channel in MAXIGAUGE_CHANNEL:
         for row in processed:
             # each channel has 6 columns, 2 are strings describing the channel/gauge and 4 are values and status
-            # data[row[0]] = {(a + b).strip(' '): [c, d, e, f] for a, b, c, d, e, f in zip(*[row[(i + 1)::6] for i in range(6)])} <= dont need status just value
-            data[row[0]] = {(a + b).strip(' '): d for a, b, _, d, _, _ in zip(*[row[(i + 1)::6] for i in range(6)])}
-        labels = list(data[row[0]].keys())
+            # {(a + b).strip(' '): [c, d, e, f] for a, b, c, d, e, f in zip(*[row[(i + 1)::6] for i in range(6)])} <= dont need status just value
+            yield row[0], {(a + b).strip(' '): d for a, b, _, d, _, _ in zip(*[row[(i + 1)::6] for i in range(6)])}
 
     elif channel in ERROR_CHANNEL:
         for row in processed:
@@ -79,60 +165,211 @@ def process_log_file_rows(processed, channel, date):
             time_str = time_dt.strftime('%d-%m-%y,%H:%M:%S')
             if time_str in ",".join(row[1:]):  # We have two errors
                 errors = [x.strip(',').split(",") for x in (",".join(row[1:])).split(time_str)]
-                #data[row[0]] = [{error[0]:error[1:]} for error in errors]
-                data[row[0]] = ", ".join([f"{error[0]}={' '.join(error[1:])}" for error in errors])
+                #[{error[0]:error[1:]} for error in errors]
+                yield row[0], ", ".join([f"{error[0]}={' '.join(error[1:])}" for error in errors])
             else:
-                #data[row[0]] = [{row[1]: ",".join(row[2:])}]
-                data[row[0]] = f"{row[1]}={' '.join(row[2:])}" #[{row[1]: ",".join(row[2:])}]
+                #[{row[1]: ",".join(row[2:])}]
+                yield row[0], f"{row[1]}={' '.join(row[2:])}" #[{row[1]: ",".join(row[2:])}]
 
     elif channel in KV_CHANNELS:
         for row in processed:
-            data[row[0]] = {k: v for k, v in zip(row[1::2], row[2::2])}
-        labels = list(data[row[0]].keys())
+            yield row[0], {k: v for k, v in zip(row[1::2], row[2::2])}
 
     elif channel in VALVECONTROL_CHANNEL: # has weird first entry which I have no idea what it represents
         for row in processed:
-            data[row[0]] = {k: v for k, v in zip(row[2::2], row[3::2])}
-            data[row[0]]['void'] = row[1] # Phantom value
-        labels = list(data[row[0]].keys())
-
+            value = {k: v for k, v in zip(row[2::2], row[3::2])}
+            value['void'] = row[1] # Phantom value
+            yield row[0], value
 
     else: # Just a normal log file with a date and a value
         for row in processed:
-            data[row[0]] = row[1]
             if len(row) > 2:
                 print(f"Warning, extra value found in {date}/{channel}, omitting")
-            labels = ['value']
+            yield row[0], row[1]
+
+def _labels(channel, last_value):
+    if channel in ERROR_CHANNEL or last_value is None:
+        return []
+    if type(last_value) == dict:
+        return list(last_value.keys())
+    return ['value']
+
+def process_log_file_rows(processed, channel, date):
+    """
+
+    :param channel: log file channel
+    :param processed: processed lines of the file
+    :return: {} processed rows
+    """
+    data = {}
+    value = None
+    for t, value in iter_log_file_rows(processed, channel=channel, date=date):
+        data[t] = value
+    return data, _labels(channel, value)
+
 
-    return data, labels
+
+def process_log_file(lines, channel, date, engine=LOG_PARSER_ENGINE):
+    """
+    parses split lines with the selected engine into (data, labels)
+
+    :param lines: lines split by comma
+    :param channel: log file channel
+    :param date: date
+    :param engine: key of PARSER_ENGINES
+    :return: data, labels
+    """
+    if engine not in PARSER_ENGINES:
+        raise ValueError(f"Unknown parser engine {engine}, must be one of {', '.join(PARSER_ENGINES.keys())}")
+    processed = PARSER_ENGINES[engine](lines, channel=channel, date=date)
+
+    # We need to check what type of file it is
+    return process_log_file_rows(processed, channel=channel, date=date)
+
+class MappedLogFile:
+    """
+    Memory mapped log file with the offset of every line, for files that are not written anymore.
+    Rows are only decoded and split when asked for, repeated reads come straight from the page cache.
+    This is not a zero copy parser: the requested rows are decoded and split into strings like any other read,
+    since the timestamp decoders and value inference work on str. What the map saves is reading and splitting
+    rows that are not asked for, and holding more than MAPPED_READ_CHUNK_ROWS split rows at once
+    """
+    def __init__(self, fname):
+        self.fname = fname
+        self.offsets = array('q', [0])  # start of every complete line, then the end of the last one
+        with open(fname, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+        find = self.map.find
+        pos = find(b'\n')
+        while pos != -1:
+            self.offsets.append(pos + 1)
+            pos = find(b'\n', pos + 1)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lines(self, start = 0, stop = None):
+        """
+        Decodes one str and one split list per row. Splitting is 13-20% of reading a row on the benchmark channels,
+        the conversions in process_log_file take the rest, so parsing fields out of the mapped bytes is not done
+
+        :return: rows start to stop split by comma, like read_log_file splits them
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return []
+        text = self.map[self.offsets[start]:self.offsets[stop]].decode('utf-8', 'replace')
+        return [l.strip(' \t\r\n').split(',') for l in text.split('\n')[:-1]]
+
+    def read(self, channel, date, start = 0, stop = None, engine = LOG_PARSER_ENGINE):
+        """
+        Parses rows start to stop, MAPPED_READ_CHUNK_ROWS at a time so only one chunk of split lines exists at once
+
+        :return: data, labels
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        data, labels = {}, []
+        for chunk in range(start, stop, MAPPED_READ_CHUNK_ROWS):
+            chunk_data, chunk_labels = process_log_file(self.lines(chunk, min(chunk + MAPPED_READ_CHUNK_ROWS, stop)), channel=channel, date=date, engine=engine)
+            data.update(chunk_data)
+            labels = chunk_labels or labels
+        return data, labels
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
+# Survives refresh_all_modules reloading this module, so a restart does not parse the same files again
+if 'PARSED_FILE_CACHE' not in globals():
+    PARSED_FILE_CACHE = ParsedFileCache(PARSED_FILE_CACHE_BYTES)
+PARSED_FILE_CACHE.limit_bytes = PARSED_FILE_CACHE_BYTES
 
-def read_log_file(channel, date, log_path = LOG_PATH):
+def _estimate_parsed_size(data, labels):
+    # Rough CPython footprint: dict slot and float key per row, plus a boxed value (and dict slot) per label
+    return len(data) * (PARSED_ROW_BYTES + PARSED_VALUE_BYTES * max(len(labels), 1))
+
+def read_log_file(channel, date, log_path = LOG_PATH, engine = LOG_PARSER_ENGINE, mapped = None, use_cache = True):
+    """
+    Parses a whole log file. Results are kept in PARSED_FILE_CACHE until the file changes,
+    the returned data is shared and must not be modified
+
+    :param mapped: read through MappedLogFile, by default for every day before today (those files are complete)
+    :param use_cache: False to always parse the file and leave PARSED_FILE_CACHE untouched, for files read only once
+    """
     suffix = f'{date}.log'
 
     if channel in CHANNELS_WITH_UNDERSCORE:
         fname = f'{channel}_{date}.log'
     else:
         fname = f'{channel} {date}.log'
+    path = os.path.abspath(os.path.join(log_path, date, fname))
 
+    stat = os.stat(path)
+    if use_cache:
+        cached = PARSED_FILE_CACHE.get(path, stat)
+        if cached is not None:
+            return cached
 
-    with open(os.path.join(log_path, date, fname), 'r') as f:
-        flines = [l.strip(' \t\r\n').split(',') for l in f.readlines() if l[-1] == '\n']
+    if mapped is None:
+        mapped = date < datetime.now().strftime(DATE_FORMAT)
+    if mapped:
+        with MappedLogFile(path) as f:
+            data, labels = f.read(channel, date, engine=engine)
+    else:
+        with open(path, 'r') as f:
+            flines = [l.strip(' \t\r\n').split(',') for l in f.readlines() if l[-1] == '\n']
+        data, labels = process_log_file(flines, channel=channel, date=date, engine=engine)
 
-    processed = process_log_file_lines(flines, channel=channel, date=date)
+    if use_cache:
+        PARSED_FILE_CACHE.put(path, stat, (data, labels), _estimate_parsed_size(data, labels))
+    return data, labels
 
+def iter_log_file_chunks(channel, date, log_path = LOG_PATH, chunk_rows = MAPPED_READ_CHUNK_ROWS, engine = LOG_PARSER_ENGINE):
+    """
+    Reads a log file chunk_rows lines at a time, so memory use does not depend on the size of the file.
+    A last line that is still being written is left out
 
-    # We need to check what type of file it is
-    return process_log_file_rows(processed, channel=channel, date=date)
+    :return: generator of lists of (time, value), in file order and with duplicate timestamps kept
+    """
+    if channel in CHANNELS_WITH_UNDERSCORE:
+        fname = f'{channel}_{date}.log'
+    else:
+        fname = f'{channel} {date}.log'
+
+    with open(os.path.join(log_path, date, fname), 'r') as f:
+        lines = []
+        for line in f:
+            if line[-1] != '\n':
+                break
+            lines.append(line.strip(' \t\r\n').split(','))
+            if len(lines) == chunk_rows:
+                yield list(iter_log_file_rows(PARSER_ENGINES[engine](lines, channel=channel, date=date), channel=channel, date=date))
+                lines = []
+        if len(lines):
+            yield list(iter_log_file_rows(PARSER_ENGINES[engine](lines, channel=channel, date=date), channel=channel, date=date))
+
+def iter_log_file(channel, date, log_path = LOG_PATH, chunk_rows = MAPPED_READ_CHUNK_ROWS, engine = LOG_PARSER_ENGINE):
+    """
+    :return: generator of (time, value) for every row of a log file, see iter_log_file_chunks
+    """
+    for chunk in iter_log_file_chunks(channel, date, log_path=log_path, chunk_rows=chunk_rows, engine=engine):
+        yield from chunk
 
 def get_last_entry(data, labels):
     """
     Determines last entry from data/labels format
     """
-    times = sorted(data.keys())
-    if len(times) > 0:
-        return times[-1], data[times[-1]]
+    if len(data) > 0:
+        last = max(data)
+        return last, data[last]
 
 if __name__ == "__main__":
     from tabulate import tabulate
@@ -1,30 +1,115 @@
 import os
+import json
 import localvars
 localvars.load_globals(localvars, globals())
 from datetime import datetime
 
-def load_calibration_dates(log_path = LOG_PATH, omit_empty_directories=True):
-    dircontents = os.listdir(log_path)
-    folders = []
-    for file in dircontents:
-        if os.path.isdir(os.path.join(log_path, file)):
-            try:
-                datetime.strptime(file, '%y-%m-%d')
-                folders.append(file)
-            except ValueError:
-                continue
-    folders = [f for f in folders if len(os.listdir(os.path.join(log_path, f))) or not omit_empty_directories]
+def _is_date_folder(name):
+    try:
+        datetime.strptime(name, DATE_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+def _is_empty_directory(path):
+    with os.scandir(path) as it:
+        return next(it, None) is None
+
+def load_calibration_dates(log_path = LOG_PATH, omit_empty_directories=True, newer_than=None):
+    """
+    Lists date folders of the log path in chronological order
+
+    :param log_path: log root
+    :param omit_empty_directories: skip folders without files
+    :param newer_than: only list folders with this date or later
+    :return: list of folder names
+    """
+    with os.scandir(log_path) as it:
+        folders = [entry.name for entry in it if entry.is_dir() and (newer_than is None or entry.name >= newer_than)]
+    folders = sorted(f for f in folders if _is_date_folder(f))
+    if omit_empty_directories:
+        folders = [f for f in folders if not _is_empty_directory(os.path.join(log_path, f))]
     return folders
 
-def load_all_possible_log_files(log_path = LOG_PATH):
-    folders = load_calibration_dates(log_path=log_path)
-    unique_files = []
-    last_logs = {}
-    for folder in folders:
-        suffix = f"{folder}.log"
-        files = [f for f in os.listdir(os.path.join(log_path, folder)) if f[-len(suffix):] == suffix]
-        files = [f[:-len(suffix)].strip('_ ') for f in files]
-        last_logs.update({f:folder for f in files})# if f in unique_files}) # add most recent ones to last logs dictionary
-        unique_files += [f for f in files if f not in unique_files]
-
-    return dict(sorted(last_logs.items(), key=lambda x:x[0]))
+def log_file_name(channel, date):
+    if channel in CHANNELS_WITH_UNDERSCORE:
+        return f'{channel}_{date}.log'
+    return f'{channel} {date}.log'
+
+def list_log_files(log_path, folder):
+    """
+    :return: channels with a log file in the folder
+    """
+    suffix = f"{folder}.log"
+    with os.scandir(os.path.join(log_path, folder)) as it:
+        return [entry.name[:-len(suffix)].strip('_ ') for entry in it if entry.name.endswith(suffix)]
+
+
+class DirectoryIndex:
+    """
+    Channel -> latest date folder map of a log path, persisted in DIRECTORY_INDEX_FILE.
+    Only folders from the newest indexed one onwards are scanned again, older folders never change
+    """
+    def __init__(self, log_path = LOG_PATH, fname = DIRECTORY_INDEX_FILE):
+        self.log_path = log_path
+        self.fname = fname
+        self.last_logs = {}
+        self.high_water = None  # newest date folder indexed
+
+    def load(self):
+        self.last_logs, self.high_water = {}, None
+        if not self.fname or not os.path.exists(self.fname):
+            return
+        try:
+            with open(self.fname, 'r') as f:
+                contents = json.load(f)
+        except Exception as e:
+            print(f"Cannot load directory index from {self.fname}: {str(e)}")
+            return
+        if contents.get('log_path') != os.path.abspath(self.log_path):
+            return
+        high_water = contents.get('high_water')
+        if high_water is not None and not os.path.isdir(os.path.join(self.log_path, high_water)):
+            print(f"Indexed folder {high_water} is gone, rebuilding directory index")
+            return
+        self.last_logs = contents.get('last_logs', {})
+        self.high_water = high_water
+
+    def save(self):
+        if not self.fname:
+            return
+        temp = f"{self.fname}.tmp"
+        try:
+            with open(temp, 'w') as f:
+                json.dump({'log_path': os.path.abspath(self.log_path), 'high_water': self.high_water, 'last_logs': self.last_logs}, f)
+            os.replace(temp, self.fname)
+        except Exception as e:
+            print(f"Cannot save directory index to {self.fname}: {str(e)}")
+
+    def refresh(self):
+        """
+        Scans folders at or after the high water mark (the newest one may still be getting new files)
+
+        :return: True if anything changed
+        """
+        changed = False
+        for folder in load_calibration_dates(log_path=self.log_path, newer_than=self.high_water):
+            for channel in list_log_files(self.log_path, folder):
+                if self.last_logs.get(channel) != folder:
+                    self.last_logs[channel] = folder
+                    changed = True
+            if folder != self.high_water:
+                self.high_water = folder
+                changed = True
+        return changed
+
+
+def load_all_possible_log_files(log_path = LOG_PATH, use_index = True):
+    """
+    :return: {channel: latest date folder} sorted by channel
+    """
+    index = DirectoryIndex(log_path, fname=DIRECTORY_INDEX_FILE if use_index else None)
+    index.load()
+    if index.refresh():
+        index.save()
+    return dict(sorted(index.last_logs.items(), key=lambda x:x[0]))
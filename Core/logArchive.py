@@ -0,0 +1,280 @@
+"""
+Columnar binary archive of closed log files, so history can be memory mapped instead of parsed from text again
+
+Every past day of a channel becomes ARCHIVE_PATH/<channel>/<date>.col:
+    magic (8 bytes) | header length (uint64) | json header | columns, each starting on an 8 byte boundary
+Column offsets in the header count from the end of the header, which is padded to 8 bytes.
+The header lists the row count, the source file size/mtime, the labels and every column with its kind:
+    'd' float64 (NaN where a sample lacks the subchannel), 'q' int64, 'j' json list (null where missing)
+Times are always a float64 column.
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+import logger
+from Core.fileUtilities import load_calibration_dates, list_log_files, log_file_name
+from Core.fileReader import read_log_file
+
+logging = logger.Logger(__file__)
+
+ARCHIVE_MAGIC = b'BFARCH1\n'
+_PREAMBLE = struct.Struct('<8sQ')
+_NAN = float('nan')
+
+
+def _pad(length):
+    return -length % 8
+
+def _encode_column(values):
+    """
+    :param values: values of one column, None where a sample does not have it
+    :return: kind, bytes
+    """
+    kinds = set(map(type, values))
+    if kinds == {int}:
+        try:
+            return 'q', array('q', values).tobytes()
+        except OverflowError:
+            pass
+    elif kinds <= {float, type(None)} and float in kinds:
+        return 'd', array('d', [_NAN if v is None else v for v in values]).tobytes()
+    return 'j', json.dumps(values).encode('utf-8')
+
+def write_archive_file(fname, data, labels, source_stat=None):
+    """
+    Writes parsed log data as a columnar archive file, atomically
+
+    :param fname: archive file
+    :param data: {time: value} as returned by read_log_file
+    :param labels: labels as returned by read_log_file
+    :param source_stat: os.stat_result of the log file it was made from
+    """
+    times = list(data.keys())
+    values = list(data.values())
+    if any(type(v) == dict for v in values):
+        names = list(dict.fromkeys(k for v in values if type(v) == dict for k in v))
+        columns = [(name, [v.get(name) if type(v) == dict else None for v in values]) for name in names]
+    else:
+        columns = [(None, values)]
+
+    blocks = [('time', 'd', array('d', times).tobytes())]
+    blocks += [(name, *_encode_column(column)) for name, column in columns]
+
+    header = {
+        'rows': len(times),
+        'byteorder': sys.byteorder,
+        'source_size': source_stat.st_size if source_stat else None,
+        'source_mtime': source_stat.st_mtime if source_stat else None,
+        'labels': labels,
+        'subchannels': columns[0][0] is not None,
+        'columns': [],
+    }
+    offset = 0
+    for name, kind, block in blocks:
+        header['columns'].append({'name': name, 'kind': kind, 'offset': offset, 'length': len(block)})
+        offset += len(block) + _pad(len(block))
+    encoded = json.dumps(header).encode('utf-8')
+    encoded += b' ' * _pad(_PREAMBLE.size + len(encoded))
+
+    os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+    temp = f"{fname}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(_PREAMBLE.pack(ARCHIVE_MAGIC, len(encoded)))
+        f.write(encoded)
+        for name, kind, block in blocks:
+            f.write(block)
+            f.write(b'\0' * _pad(len(block)))
+    os.replace(temp, fname)
+
+
+class ArchiveFile:
+    """
+    Memory mapped archive file. Numeric columns are zero copy memoryviews into the map
+    """
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, 'rb') as f:
+            magic, length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError(f"{fname} is not a log archive file")
+            self.header = json.loads(f.read(length))
+            self.data_start = _PREAMBLE.size + length
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else None
+        if self.header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{fname} was written on a {self.header['byteorder']} endian machine")
+        self.columns = {column['name']: column for column in self.header['columns'][1:]}
+        self.labels = self.header['labels']
+        self.rows = self.header['rows']
+
+    def _column(self, column):
+        start = self.data_start + column['offset']
+        block = memoryview(self.map)[start:start + column['length']] if self.map else memoryview(b'')
+        if column['kind'] == 'j':
+            return json.loads(bytes(block))
+        return block.cast(column['kind'])
+
+    def times(self):
+        return self._column(self.header['columns'][0])
+
+    def subchannels(self):
+        return list(self.columns.keys()) if self.header['subchannels'] else []
+
+    def column(self, subchannel = None):
+        """
+        :return: values of one subchannel (None for single value channels), memoryview or list
+        """
+        return self._column(self.columns[subchannel])
+
+    def is_current(self, source_stat):
+        """
+        :return: True if made from a log file of this size and modification time
+        """
+        return self.header['source_size'] == source_stat.st_size and self.header['source_mtime'] == source_stat.st_mtime
+
+    def read(self):
+        """
+        :return: data, labels like read_log_file
+        """
+        times = self.times()
+        if not self.header['subchannels']:
+            return dict(zip(times, self.column(None))), self.labels
+        data = {t: {} for t in times}
+        for name, column in self.columns.items():
+            for t, v in zip(times, self._column(column)):
+                if v is not None and v == v: # null or NaN where the sample did not have the subchannel
+                    data[t][name] = v
+        return data, self.labels
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = None
+
+
+class LogArchive:
+    """
+    Archive of a log path. Only days before the newest date folder are compacted, those files are not written anymore.
+    Like the DirectoryIndex, folders older than the newest compacted one are not looked at again
+    """
+    def __init__(self, log_path = LOG_PATH, archive_path = ARCHIVE_PATH):
+        self.log_path = log_path
+        self.archive_path = archive_path
+        self.high_water = None
+        self.compacted = 0
+
+    def archive_file(self, channel, date):
+        return os.path.join(self.archive_path, channel, f"{date}.col")
+
+    def _index_file(self):
+        return os.path.join(self.archive_path, 'index.json')
+
+    def load(self):
+        self.high_water = None
+        try:
+            with open(self._index_file(), 'r') as f:
+                contents = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning(f"Cannot load archive index: {str(e)}")
+            return
+        if contents.get('log_path') == os.path.abspath(self.log_path):
+            self.high_water = contents.get('high_water')
+
+    def save(self):
+        temp = f"{self._index_file()}.tmp"
+        try:
+            os.makedirs(self.archive_path, exist_ok=True)
+            with open(temp, 'w') as f:
+                json.dump({'log_path': os.path.abspath(self.log_path), 'high_water': self.high_water}, f)
+            os.replace(temp, self._index_file())
+        except Exception as e:
+            logging.error(f"Cannot save archive index: {str(e)}")
+
+    def open(self, channel, date):
+        """
+        :return: ArchiveFile of the day, None if it was not archived or the log file changed since
+        """
+        fname = self.archive_file(channel, date)
+        if not self.archive_path or not os.path.exists(fname):
+            return None
+        try:
+            archive = ArchiveFile(fname)
+        except Exception as e:
+            logging.warning(f"Cannot open archive {fname}: {str(e)}")
+            return None
+        try:
+            source_stat = os.stat(os.path.join(self.log_path, date, log_file_name(channel, date)))
+        except FileNotFoundError:
+            return archive # The text log was removed, the archive is all there is
+        if not archive.is_current(source_stat):
+            archive.close()
+            return None
+        return archive
+
+    def read(self, channel, date, use_cache = True):
+        """
+        Reads a day from the archive when possible, from the text log otherwise
+
+        :param use_cache: passed to read_log_file
+        :return: data, labels like read_log_file
+        """
+        archive = self.open(channel, date)
+        if archive is not None:
+            return archive.read()
+        return read_log_file(channel, date, log_path=self.log_path, use_cache=use_cache)
+
+    def compact_file(self, channel, date):
+        """
+        Parses one log file into its archive file, unless it is already archived
+
+        :return: True if written
+        """
+        source = os.path.join(self.log_path, date, log_file_name(channel, date))
+        source_stat = os.stat(source)
+        archive = self.open(channel, date)
+        if archive is not None:
+            current = archive.is_current(source_stat)
+            archive.close()
+            if current:
+                return False
+        data, labels = read_log_file(channel, date, log_path=self.log_path, use_cache=False) # Read once, keep it out of the cache
+        write_archive_file(self.archive_file(channel, date), data, labels, source_stat)
+        self.compacted += 1
+        return True
+
+    def compact(self, should_stop = None):
+        """
+        Compacts every closed day that is not archived yet
+
+        :param should_stop: callable checked between files, to abandon the pass
+        :return: number of files written
+        """
+        if not self.archive_path:
+            return 0
+        self.load()
+        folders = load_calibration_dates(log_path=self.log_path, newer_than=self.high_water)
+        written = 0
+        failed = False # Once a folder has a file that failed, high_water stays before it so the next pass retries it
+        for folder in folders[:-1]: # The newest folder is still being written
+            for channel in list_log_files(self.log_path, folder):
+                if should_stop and should_stop():
+                    return written
+                if channel in CHANNEL_BLACKLIST:
+                    continue
+                try:
+                    written += self.compact_file(channel, folder)
+                except Exception as e:
+                    failed = True
+                    logging.error(f"Cannot archive {folder}/{channel}: {str(e)}")
+            if not failed:
+                self.high_water = folder
+                self.save()
+        if written:
+            logging.info(f"Archived {written} log files")
+        return written
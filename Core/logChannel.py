@@ -0,0 +1,189 @@
+"""
+Tailing reader of one channel's log file. Kept free of Qt and the GUI so loader processes only import what they need
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+import os
+import logger
+from Core.fileReader import process_log_file
+from Core.sampleBatch import SampleBatch
+from Core.sampleStore import ChannelStore
+
+logging = logger.Logger(__file__)
+
+
+class LogChannel:
+    def __init__(self, channel, log_path=LOG_PATH):
+        self.fd = None
+        self.fname = None
+        self.date = None
+        self.channel = channel
+
+        self.labels = []
+        self.data = ChannelStore()
+        self.resumed = False  # Restored from a checkpoint, the store then only holds its tail of the day
+        self.last_data = {}
+        self.last_time = None
+
+        self.log_path = log_path
+
+        # Tailing state, offset is the first byte not read yet and partial is an unfinished line carried over
+        self.offset = 0
+        self.partial = b''
+        self.buffer = bytearray(TAIL_BUFFER_SIZE)
+
+
+
+    def update_path_information(self, date = None):
+        if date:
+            self.date = date
+        if self.channel in CHANNELS_WITH_UNDERSCORE:
+            self.fname = f'{self.channel}_{self.date}.log'
+        else:
+            self.fname = f'{self.channel} {self.date}.log'
+
+
+        return self.fname
+
+    def open(self, date = None):
+        if date and date != self.date: # New file, start reading from the beginning
+            self.offset = 0
+            self.partial = b''
+        if date:
+            self.date = date
+        self.close()
+        self.update_path_information(self.date)
+        self.fd = open(os.path.join(self.log_path, self.date, self.fname), 'rb', buffering=0)
+
+    def read_lines(self):
+        """
+        Reads the bytes written since the last call and returns the complete lines among them.
+        A trailing line without a newline (mid-write) is kept and completed by the next call.
+
+        :return: list of decoded lines, without line endings
+        """
+        size = os.fstat(self.fd.fileno()).st_size
+        if size < self.offset:
+            logging.warning(f"{self.fname} shrank from {self.offset} to {size} bytes, reading it again from the start")
+            self.offset = 0
+            self.partial = b''
+
+        chunks = []
+        while self.offset < size:
+            self.fd.seek(self.offset)
+            with memoryview(self.buffer) as view:
+                n = self.fd.readinto(view[:min(len(self.buffer), size - self.offset)])
+                if not n:
+                    break
+                self.offset += n
+                end = self.buffer.rfind(b'\n', 0, n) + 1
+                if end == 0:
+                    self.partial += view[:n]
+                    continue
+                chunks.append(self.partial + view[:end])
+                self.partial = bytes(view[end:n])
+
+        if len(chunks) == 0:
+            return []
+        return b''.join(chunks).decode('utf-8', errors='replace').split('\n')[:-1]
+
+    def update(self):
+        """
+        Reads and stores everything written since the last update
+
+        :return: SampleBatch with every new sample, None if there was nothing new
+        """
+        if not self.fd:
+            return None
+        flines = [l.strip(' \t\r\n').split(',') for l in self.read_lines()]
+
+        if len(flines) == 0:
+            return None
+        data, labels = process_log_file(flines, channel=self.channel, date=self.date)
+        if len(data) == 0:
+            return None
+        self.labels = labels
+        self.data.extend(data.items())
+
+        last_time, last_data = self.data.latest()
+        if last_time is None or last_data is None: # This might prevent the None,None error
+            return None
+        self.last_time = last_time
+        self.last_data = last_data
+        return SampleBatch.FromDict(data)
+
+    def __getstate__(self):
+        # Sent to loader processes without the file descriptor and read buffer
+        state = self.__dict__.copy()
+        state['fd'] = None
+        state['buffer'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.buffer = bytearray(TAIL_BUFFER_SIZE)
+
+    def checkpoint(self):
+        """
+        :return: json serializable read state of the channel, None if nothing was read yet
+        """
+        if self.date is None or self.offset == 0:
+            return None
+        try:
+            stat = os.stat(os.path.join(self.log_path, self.date, self.fname))
+        except OSError:
+            return None
+        return {
+            'date': self.date,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'offset': self.offset,
+            'partial': self.partial.decode('latin-1'),
+            'labels': self.labels,
+            'last_time': self.last_time,
+            'last_data': self.last_data,
+            'tail': self.data.tail(CHECKPOINT_TAIL_LENGTH),
+        }
+
+    def restore(self, checkpoint):
+        """
+        Resumes from a checkpoint if it matches the opened file, which may only have grown since
+
+        :param checkpoint: dictionary made by checkpoint()
+        :return: True if restored
+        """
+        if not self.fd or checkpoint.get('date') != self.date:
+            return False
+        stat = os.fstat(self.fd.fileno())
+        if stat.st_size < checkpoint['offset'] or stat.st_mtime < checkpoint['mtime']:
+            return False
+        self.offset = checkpoint['offset']
+        self.partial = checkpoint['partial'].encode('latin-1')
+        self.labels = checkpoint['labels']
+        self.last_time = checkpoint['last_time']
+        self.last_data = checkpoint['last_data']
+        self.data = ChannelStore()
+        self.data.extend(checkpoint['tail'])
+        self.resumed = True
+        return True
+
+    def close(self):
+        if self.fd:
+            self.fd.close()
+            self.fd = None
+
+    def __del__(self):
+        self.close()
+
+
+def load_log_channel(logChannel):
+    """
+    Reads everything not read yet from a (possibly checkpoint restored) log channel. Runs in loader processes
+
+    :param logChannel: LogChannel with its date set
+    :return: the updated LogChannel
+    """
+    logChannel.open()
+    logChannel.update()
+    logChannel.close()
+    return logChannel
@@ -0,0 +1,181 @@
+"""
+Time range queries over the log tree, reading only the part of each day file that covers the range
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from Core.timestampDecoder import get_timestamp_decoder
+from Core.fileReader import process_log_file
+from Core.fileUtilities import log_file_name
+
+
+class SparseLogIndex:
+    """
+    Byte offset and time of every QUERY_INDEX_STRIDE-th line of a log file. Building it only splits lines,
+    nothing is parsed but the timestamps of the indexed lines. Files that grew are indexed from where it stopped
+    """
+    def __init__(self, fname, stride = QUERY_INDEX_STRIDE):
+        self.fname = fname
+        self.stride = stride
+        self.offsets = array('q')
+        self.times = array('d')
+        self.size = 0  # bytes indexed, always at the end of a complete line
+        self.rows = 0
+        self._decode = get_timestamp_decoder(TIMESTAMP_DECODER)
+
+    def update(self):
+        """
+        Indexes lines written since the last update, starting over if the file shrank
+        """
+        size = os.path.getsize(self.fname)
+        if size < self.size:
+            self.offsets, self.times, self.size, self.rows = array('q'), array('d'), 0, 0
+        if size == self.size:
+            return
+        with open(self.fname, 'rb') as f:
+            f.seek(self.size)
+            offset = self.size
+            for line in f:
+                if line[-1:] != b'\n':
+                    break # Still being written
+                if self.rows % self.stride == 0:
+                    try:
+                        date, time, _ = line.decode('latin-1').split(',', 2)
+                        t = self._decode(date, time)
+                    except ValueError:
+                        t = None
+                    if t is not None and (not len(self.times) or t >= self.times[-1]):
+                        self.offsets.append(offset)
+                        self.times.append(t)
+                    else:
+                        self.rows -= 1 # Unreadable or out of order line, try to index the next one instead
+                offset += len(line)
+                self.rows += 1
+        self.size = offset
+
+    def span(self, t0, t1):
+        """
+        :return: (start, end) byte range holding every line with t0 <= time <= t1
+        """
+        first = bisect_left(self.times, t0) - 1 # Before every indexed line at t0, unindexed lines before them can share the time
+        start = self.offsets[first] if first >= 0 else 0
+        last = bisect_right(self.times, t1)
+        end = self.offsets[last] if last < len(self.offsets) else self.size
+        return start, end
+
+
+def _column(values):
+    kinds = set(map(type, values))
+    if kinds == {float}:
+        return array('d', values)
+    if kinds == {int}:
+        try:
+            return array('q', values)
+        except OverflowError:
+            pass
+    return values
+
+
+class LogQuery:
+    """
+    query(channel, subchannel, t0, t1) over any number of date folders. Days in the archive are answered
+    from the memory mapped columns, the others by seeking to the indexed lines around the range
+    """
+    def __init__(self, log_path = LOG_PATH, archive = None):
+        self.log_path = log_path
+        self.archive = archive
+        self.indices = OrderedDict()  # fname -> SparseLogIndex, least recently used first, at most QUERY_INDEX_FILES
+        self._lock = threading.Lock()
+
+    def index(self, channel, date):
+        fname = os.path.join(self.log_path, date, log_file_name(channel, date))
+        with self._lock:
+            index = self.indices.get(fname)
+            if index is None:
+                index = self.indices[fname] = SparseLogIndex(fname)
+                while len(self.indices) > QUERY_INDEX_FILES:
+                    self.indices.popitem(last=False)
+            else:
+                self.indices.move_to_end(fname)
+        index.update()
+        return index
+
+    def dates_between(self, t0, t1):
+        """
+        :return: date folders that may hold samples between t0 and t1, oldest first
+        """
+        day = datetime.fromtimestamp(t0).date()
+        last = datetime.fromtimestamp(t1).date()
+        dates = []
+        while day <= last:
+            date = day.strftime(DATE_FORMAT)
+            if os.path.isdir(os.path.join(self.log_path, date)):
+                dates.append(date)
+            day += timedelta(days=1)
+        return dates
+
+    def _query_archive(self, channel, subchannel, date, t0, t1):
+        archive = self.archive.open(channel, date) if self.archive else None
+        if archive is None:
+            return None
+        if subchannel not in archive.columns:
+            return array('d'), []
+        times = archive.times()
+        begin, end = bisect_left(times, t0), bisect_right(times, t1)
+        values = archive.column(subchannel)[begin:end]
+        times = times[begin:end]
+        if type(values) == list:
+            keep = [i for i, v in enumerate(values) if v is not None]
+            return array('d', [times[i] for i in keep]), [values[i] for i in keep]
+        if values.format == 'd':
+            keep = [i for i, v in enumerate(values) if v == v]
+            if len(keep) != len(values):
+                return array('d', [times[i] for i in keep]), array('d', [values[i] for i in keep])
+        return array('d', times), array(values.format, values)
+
+    def _query_log_file(self, channel, subchannel, date, t0, t1):
+        try:
+            index = self.index(channel, date)
+        except FileNotFoundError:
+            return array('d'), []
+        start, end = index.span(t0, t1)
+        with open(index.fname, 'rb') as f:
+            f.seek(start)
+            chunk = f.read(end - start).decode('latin-1')
+        lines = [l.strip(' \t\r\n').split(',') for l in chunk.splitlines()]
+        data, labels = process_log_file(lines, channel=channel, date=date)
+        times, values = array('d'), []
+        for t, value in data.items():
+            if t < t0 or t > t1:
+                continue
+            if subchannel is not None:
+                if type(value) != dict or subchannel not in value:
+                    continue
+                value = value[subchannel]
+            times.append(t)
+            values.append(value)
+        return times, values
+
+    def query(self, channel, subchannel, t0, t1):
+        """
+        Samples of a channel between two times, across date folders
+
+        :param channel: log channel
+        :param subchannel: subchannel, None for single value channels
+        :param t0: start timestamp (inclusive)
+        :param t1: end timestamp (inclusive)
+        :return: times, values. times is an array('d'), values an array for numeric columns and a list otherwise
+        """
+        times, values = array('d'), []
+        for date in self.dates_between(t0, t1):
+            day = self._query_archive(channel, subchannel, date, t0, t1)
+            if day is None:
+                day = self._query_log_file(channel, subchannel, date, t0, t1)
+            times.extend(day[0])
+            values.extend(day[1])
+        return times, _column(values)
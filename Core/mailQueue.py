@@ -0,0 +1,206 @@
+"""
+Background email sender. Emails are queued by the Mailer and sent from a worker thread over one authenticated SMTP
+connection kept open between emails, so alerts never wait on the network in the GUI thread
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+import time
+import queue
+import smtplib
+import threading
+from email.mime.text import MIMEText
+import logger
+
+logging = logger.Logger(__file__)
+
+
+class MailMessage:
+    def __init__(self, subject, body, sender, recipients, password, smtp_server, smtp_port, priority=0):
+        """
+        Carries the mailer settings it was queued with, so settings changed while it waits apply to the next emails only
+
+        :param priority: the subject of the highest priority email is kept when emails are batched
+        """
+        self.subject = subject
+        self.body = body
+        self.sender = sender
+        self.recipients = list(recipients)
+        self.password = password
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.priority = priority
+        self.queued_at = time.time()
+
+    def account(self):
+        return (self.smtp_server, self.smtp_port, self.sender, self.password)
+
+    def as_string(self):
+        msg = MIMEText(self.body)
+        msg['Subject'] = self.subject
+        msg['From'] = self.sender
+        msg['To'] = ', '.join(self.recipients)
+        return msg.as_string()
+
+
+def merge_messages(messages):
+    """
+    Batches emails going to the same recipients from the same account into one
+
+    :return: messages to send, in the order the first of each batch was queued
+    """
+    batches = {}
+    for message in messages:
+        key = (message.account(), tuple(message.recipients))
+        batches.setdefault(key, []).append(message)
+    ret = []
+    for batch in batches.values():
+        if len(batch) == 1:
+            ret.append(batch[0])
+            continue
+        first = max(batch, key=lambda m: m.priority)
+        subject = f"{first.subject} (+{len(batch) - 1} more)"
+        body = MAIL_BATCH_SEPARATOR.join(m.body for m in batch)
+        ret.append(MailMessage(subject, body, first.sender, first.recipients, first.password, first.smtp_server,
+                               first.smtp_port, first.priority))
+    return ret
+
+
+class MailQueue(threading.Thread):
+    """
+    Worker thread sending queued emails. Emails queued within MAIL_BATCH_SECONDS of each other are sent as one.
+    The connection is reused until it stayed idle for MAIL_IDLE_SECONDS, and reopened if the server dropped it.
+    Failed emails are retried with exponential backoff, then logged and dropped
+    """
+    def __init__(self, use_ssl = SMTP_USE_SSL, batch_seconds = MAIL_BATCH_SECONDS, idle_seconds = MAIL_IDLE_SECONDS,
+                 retries = MAIL_RETRIES, retry_seconds = MAIL_RETRY_SECONDS, retry_max_seconds = MAIL_RETRY_MAX_SECONDS,
+                 timeout = MAIL_TIMEOUT):
+        super().__init__(daemon=True)
+        self.use_ssl = use_ssl
+        self.batch_seconds = batch_seconds
+        self.idle_seconds = idle_seconds
+        self.retries = retries
+        self.retry_seconds = retry_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.connection = None
+        self.connected_account = None
+        # Counters, mostly for tests
+        self.sent = 0
+        self.failed = 0
+        self.batched = 0
+        self.connections = 0
+
+    def put(self, message):
+        self.queue.put(message)
+
+    def stop(self, timeout = MAIL_STOP_TIMEOUT):
+        """
+        Sends what is queued, giving up on retries, then closes the connection
+        """
+        self.stopping.set()
+        self.queue.put(None)
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        stopped = False
+        while not stopped:
+            try:
+                message = self.queue.get(timeout=self.idle_seconds if self.connection is not None else None)
+            except queue.Empty:
+                self._disconnect() # Idle, the next email reconnects
+                continue
+            if message is None:
+                break
+            batch = [message]
+            deadline = time.monotonic() + self.batch_seconds
+            while not self.stopping.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    message = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if message is None:
+                    stopped = True
+                    break
+                batch.append(message)
+            while self.stopping.is_set() and not stopped:
+                # Stopping, send everything left without waiting for the batch to fill
+                try:
+                    message = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    stopped = True
+                else:
+                    batch.append(message)
+            messages = merge_messages(batch)
+            self.batched += len(batch) - len(messages)
+            for message in messages:
+                self._deliver(message)
+        self._disconnect()
+
+    def _deliver(self, message):
+        for attempt in range(self.retries + 1):
+            try:
+                self._send(message)
+                self.sent += 1
+                return True
+            except Exception as e:
+                self._disconnect()
+                if attempt == self.retries or self.stopping.is_set():
+                    logging.error(f"Failed to send email '{message.subject}': {str(e)}")
+                    break
+                delay = min(self.retry_seconds * 2 ** attempt, self.retry_max_seconds)
+                logging.warning(f"Failed to send email '{message.subject}' (attempt {attempt + 1}): {str(e)}, retrying in {delay} s")
+                if self.stopping.wait(delay):
+                    logging.error(f"Dropped email '{message.subject}' while stopping")
+                    break
+        self.failed += 1
+        return False
+
+    def _send(self, message):
+        if self.connection is not None and self.connected_account != message.account():
+            self._disconnect() # Mailer settings changed
+        reused = self.connection is not None
+        if not reused:
+            self._connect(message)
+        try:
+            self.connection.sendmail(message.sender, message.recipients, message.as_string())
+        except smtplib.SMTPServerDisconnected:
+            if not reused:
+                raise
+            # The server closed the connection kept open, which is not a failure of this email
+            self._disconnect()
+            self._connect(message)
+            self.connection.sendmail(message.sender, message.recipients, message.as_string())
+
+    def _connect(self, message):
+        smtp = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        connection = smtp(message.smtp_server, message.smtp_port, timeout=self.timeout)
+        try:
+            if message.password:
+                connection.login(message.sender, message.password)
+        except Exception:
+            connection.close()
+            raise
+        self.connection = connection
+        self.connected_account = message.account()
+        self.connections += 1
+
+    def _disconnect(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.quit()
+        except Exception:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+        self.connection = None
+        self.connected_account = None
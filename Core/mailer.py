@@ -1,8 +1,6 @@
 # This sends the emails
 
 from datetime import datetime
-import smtplib
-from email.mime.text import MIMEText
 import logger
 
 logging = logger.Logger(__file__)
@@ -10,12 +8,18 @@ import localvars
 import localvars
 localvars.load_globals(localvars, globals())
 from tabulate import tabulate
+from Core.mailQueue import MailQueue, MailMessage
 
-def _write_alert_email(triggered_monitors_str, data_dump_str):
-    return f"""
+def _write_alert_email(triggered_monitors_str, data_dump_str, resolved_str=''):
+    triggered_section = f"""
 The following monitors triggered this alert:
 {triggered_monitors_str}
-
+""" if triggered_monitors_str else ''
+    resolved_section = f"""
+The following alerts cleared:
+{resolved_str}
+""" if resolved_str else ''
+    return f"""{triggered_section}{resolved_section}
 Fridge log dump:
 {data_dump_str}
 
@@ -34,24 +38,26 @@ Sincerely,
 BlueFors Fridge
 """
 
-def _send_email(subject, body, sender, recipients, password, smtp_server, smtp_port):
-    msg = MIMEText(body)
-    msg['Subject'] = subject
-    msg['From'] = sender
-    msg['To'] = ', '.join(recipients)
-    with smtplib.SMTP_SSL(smtp_server, smtp_port) as smtp_server:
-       smtp_server.login(sender, password)
-       smtp_server.sendmail(sender, recipients, msg.as_string())
-    return True
-
-
 class Mailer:
-    def __init__(self, recipients, email=localvars.SENDER, password=localvars.PASSWORD, smtp_server=localvars.SMTP_SERVER, smtp_port=localvars.SMTP_PORT):
+    def __init__(self, recipients, email=localvars.SENDER, password=localvars.PASSWORD, smtp_server=localvars.SMTP_SERVER, smtp_port=localvars.SMTP_PORT, mail_queue=None):
+        """
+        :param mail_queue: MailQueue the emails are sent through, a new one is started if None
+        """
         self.recipients = recipients
         self.sender = email
         self.password = password
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
+        self.queue = mail_queue
+        if self.queue is None:
+            self.queue = MailQueue()
+            self.queue.start()
+
+    def stop(self):
+        """
+        Sends the queued emails and stops the mail thread
+        """
+        self.queue.stop()
 
 
     def stringTriggeredMonitors(self, monitors, all_values):
@@ -90,24 +96,43 @@ class Mailer:
         ))
         return tabulated_data_dump_str
 
-    def send_alert(self, monitors, all_values):
-        subject = '[URGENT] BlueFors Alert Triggered!'
+    def alertSeverity(self, monitors):
+        """
+        :return: highest severity of the triggered monitors, None if there are none
+        """
+        severities = [
+            obj.get('severity', DEFAULT_MONITOR_SEVERITY) if 'currentValue' in obj else vobj.get('severity', DEFAULT_MONITOR_SEVERITY)
+            for channel, obj in monitors.items()
+            for vobj in ([obj] if 'currentValue' in obj else obj.values())
+        ]
+        return max(severities, key=MONITOR_SEVERITIES.index) if len(severities) else None
+
+    def send_alert(self, monitors, all_values, resolved=()):
+        """
+        :param monitors: triggered monitors, from MonitorManager.triggeredMonitorInfo
+        :param all_values: latest value of every channel
+        :param resolved: descriptions of the alerts that cleared
+        """
+        severity = self.alertSeverity(monitors)
+        subject = ALERT_SUBJECTS[severity] if severity is not None else ALERT_RESOLVED_SUBJECT
 
         triggered_monitors_str = self.stringTriggeredMonitors(monitors, all_values)
+        resolved_str = "\n".join(resolved)
         data_dump_str = self.stringTabulatedDataDump(all_values)
         if INDENT_EMAIL_INFORMATION:
-            triggered_monitors_str = "\t" + "\n\t".join(triggered_monitors_str.split('\n'))
+            triggered_monitors_str = "\t" + "\n\t".join(triggered_monitors_str.split('\n')) if triggered_monitors_str else ''
+            resolved_str = "\t" + "\n\t".join(resolved_str.split('\n')) if resolved_str else ''
             data_dump_str = "\t" + "\n\t".join(data_dump_str.split('\n'))
-        text = _write_alert_email(triggered_monitors_str, data_dump_str)
+        text = _write_alert_email(triggered_monitors_str, data_dump_str, resolved_str)
         if DEBUG_MODE:
             current_time = datetime.now().strftime(f"{DATE_FORMAT}_{TIME_FORMAT}")
-            with open(f"./testEmails/alert_{current_time.replace(':','-')}.email", 'w', encoding='utf-8') as f:
+            with open(f"{ROOT_DIR}/testEmails/alert_{current_time.replace(':','-')}.email", 'w', encoding='utf-8') as f:
                 f.write(f"Subject: {subject}\n")
                 f.write(f"Recipients: {', '.join(RECIPIENTS)}\n")
                 f.write(f"Body:\n")
                 f.write(text)
         else:
-            self._send_email(subject, text)
+            self._send_email(subject, text, priority=MONITOR_SEVERITIES.index(severity) + 1 if severity is not None else 0)
 
 
     def send_test(self, all_values):
@@ -127,20 +152,18 @@ class Mailer:
 
 
 
-    def _send_email(self, subject, text):
-        # THis sends the email with smptlib
-        try:
-            _send_email(
-                subject=subject,
-                body=text,
-                sender=self.sender,
-                recipients=self.recipients,
-                password=self.password,
-                smtp_server=self.smtp_server,
-                smtp_port=self.smtp_port,
-            )
-        except Exception as e:
-            logging.error(f"Failed to send email: {str(e)}")
+    def _send_email(self, subject, text, priority=0):
+        # Queued for the mail thread, which sends it with smtplib
+        self.queue.put(MailMessage(
+            subject=subject,
+            body=text,
+            sender=self.sender,
+            recipients=self.recipients,
+            password=self.password,
+            smtp_server=self.smtp_server,
+            smtp_port=self.smtp_port,
+            priority=priority,
+        ))
 
     def _possible_str_alerts(self, monitors, all_values):
         triggered_monitors_str = "\n".join([
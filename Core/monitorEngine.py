@@ -0,0 +1,128 @@
+"""
+Active monitors compiled into a flat channel -> subchannel -> predicates index, checked a whole batch column at a time
+"""
+import logger
+
+logging = logger.Logger(__file__)
+
+
+def compile_monitor(monitor):
+    """
+    :return: predicate over a column of values, True if any of them triggers the monitor
+    """
+    compiled = getattr(monitor, 'compile', None)
+    predicate = compiled() if compiled else None
+    if predicate is None:
+        check = monitor.checkValue
+        predicate = lambda column: any(map(check, column))
+    return predicate
+
+
+class SignalMonitors:
+    """
+    Every monitor of one channel or subchannel. They are checked against the same column, and threshold monitors
+    share a single min/max of it instead of each scanning the column
+    """
+    def __init__(self, monitors):
+        """
+        :param monitors: {monitor id: monitor}
+        """
+        self.predicates = []  # (monitor id, predicate)
+        self.extremes = []  # (monitor id, function(minimum, maximum)), only used with at least two of them
+        self.stateful = []  # (monitor id, checkSamples(times, values)), fed every sample
+        for monitor_id, monitor in monitors.items():
+            if hasattr(monitor, 'checkSamples'):
+                self.stateful.append((monitor_id, monitor.checkSamples))
+                continue
+            compiled = getattr(monitor, 'compile_extremes', None)
+            extremes = compiled() if compiled else None
+            if extremes is not None:
+                self.extremes.append((monitor_id, extremes))
+            self.predicates.append((monitor_id, compile_monitor(monitor)))
+        if len(self.extremes) < 2:
+            self.extremes = []
+        self.shared = {monitor_id for monitor_id, _ in self.extremes}
+
+    def evaluate(self, times, column, ret):
+        """
+        :param times: timestamps of the values
+        :param column: new values of the signal, without missing ones
+        :param ret: {monitor id: triggered} to fill
+        """
+        if not len(column):
+            return
+        for monitor_id, check in self.stateful:
+            ret[monitor_id] = check(times, column)
+        shared = None
+        if self.extremes:
+            try:
+                total = sum(column)
+            except TypeError:
+                total = None # Not only numbers
+            if total is not None and total == total: # A NaN sum means NaN (or inf - inf), which min/max cannot see
+                lo, hi = min(column), max(column)
+                for monitor_id, extremes in self.extremes:
+                    ret[monitor_id] = extremes(lo, hi)
+                shared = self.shared
+        for monitor_id, predicate in self.predicates:
+            if shared is None or monitor_id not in shared:
+                ret[monitor_id] = predicate(column)
+
+
+class CompiledMonitors:
+    def __init__(self, monitors):
+        """
+        :param monitors: {channel: {subchannel: {monitor id: monitor}}} as kept by MonitorManager, None for single value channels
+        """
+        self.single = {}  # channel -> SignalMonitors
+        self.subchannels = {}  # channel -> [(subchannel, SignalMonitors)]
+        for channel, channel_monitors in monitors.items():
+            if None in channel_monitors:
+                self.single[channel] = SignalMonitors(channel_monitors[None])
+            else:
+                self.subchannels[channel] = [(subchannel, SignalMonitors(signal)) for subchannel, signal in channel_monitors.items()]
+
+    def evaluate(self, signaledValues):
+        """
+        :param signaledValues: {channel: SampleBatch}
+        :return: {monitor id: triggered} for every monitor of a channel with new values
+        """
+        ret = {}
+        single, subchannels = self.single, self.subchannels
+        for channel, batch in signaledValues.items():
+            signal = single.get(channel)
+            if signal is not None:
+                values = batch.values
+                if dict in map(type, values):
+                    logging.error(f"{channel} with subchannels had an invalid read")
+                    continue
+                signal.evaluate(batch.times, values, ret)
+                continue
+            monitored = subchannels.get(channel)
+            if monitored is None:
+                continue
+            columns = _transpose(batch.values)
+            for subchannel, signal in monitored:
+                if columns is not None:
+                    column = columns.get(subchannel)
+                    if column is not None:
+                        signal.evaluate(batch.times, column, ret)
+                    continue
+                # Rows with different subchannels, gather each monitored column on its own
+                column = batch.column(subchannel)
+                kept = [i for i, v in enumerate(column) if v is not None]
+                signal.evaluate([batch.times[i] for i in kept], [column[i] for i in kept], ret)
+        return ret
+
+
+def _transpose(values):
+    """
+    :return: {subchannel: tuple of values} when every row is a dictionary with the same subchannels, else None
+    """
+    if not len(values) or type(values[0]) != dict:
+        return None
+    keys = tuple(values[0])
+    for value in values:
+        if type(value) != dict or tuple(value) != keys: # Same subchannels in the same order, or values would not line up
+            return None
+    return dict(zip(keys, zip(*[value.values() for value in values])))
@@ -1,82 +1,115 @@
+import localvars
+localvars.load_globals(localvars, globals())
 import logger
+from Core.monitorEngine import CompiledMonitors
 
 logging = logger.Logger(__file__)
 
 
+def signal_name(channel, subchannel):
+    return channel if subchannel is None else f"{channel}{SUBCHANNEL_DELIMITER}{subchannel}"
+
+
 class MonitorManager():
     def __init__(self, parent):
         self.parent = parent
-        self.monitors = {}
+        self.monitors = {} # {channel: {subchannel: {monitor id: monitor}}}, None subchannel for single value channels
+        self.signals = {} # monitor id -> (channel, subchannel)
+        self.severities = {} # monitor id -> severity
         self.values = {} # monitor values saved
+        self.compiled = None # Rebuilt on the next check whenever monitors are added or removed
+
+    def addMonitor(self, channel, subchannel, type, values, variables, monitor_id=None, severity=DEFAULT_MONITOR_SEVERITY):
+        """
+        Adds a monitor next to the ones already on the channel or subchannel
 
-    def addMonitor(self, channel, subchannel, type, values, variables):
-        if channel in self.monitors and subchannel in self.monitors[channel]:
-            self.removeMonitor(channel, subchannel) # Just in case
+        :param monitor_id: unique name of the monitor, defaults to the channel[:subchannel] name. A monitor with the same id is replaced
+        :param severity: one of MONITOR_SEVERITIES
+        :return: monitor id
+        """
+        if monitor_id is None:
+            monitor_id = signal_name(channel, subchannel)
+        if severity not in MONITOR_SEVERITIES:
+            logging.warning(f"Unknown severity {severity} for monitor {monitor_id}, using {DEFAULT_MONITOR_SEVERITY}")
+            severity = DEFAULT_MONITOR_SEVERITY
+        if monitor_id in self.signals:
+            self.removeMonitor(*self.signals[monitor_id], monitor_id=monitor_id)
+        self.compiled = None
         if channel not in self.monitors:
             self.monitors[channel] = {}
         if subchannel not in self.monitors[channel]:
-            self.monitors[channel][subchannel] = type(**values, **variables)
-
-            # None works as an iterable^
-            return
-        logging.error("Cannot add monitor channel {channel} subchannel {subchannel} because it already exists")
+            self.monitors[channel][subchannel] = {}
+        # None works as an iterable^
+        monitor = self.monitors[channel][subchannel][monitor_id] = type(**values, **variables)
+        if hasattr(monitor, 'seed'):
+            self._seed(channel, subchannel, monitor)
+        self.signals[monitor_id] = (channel, subchannel)
+        self.severities[monitor_id] = severity
+        return monitor_id
 
-        """ not safe because sometimes no channel
-        if channel not in self.monitors:
-            self.monitors[channel] = {}
-            if subchannel:
-                self.monitors[channel][subchannel] = type(**values, **variables)
-            else:
-                self.monitors[channel] = type(**values, **variables)
+    def removeMonitor(self, channel, subchannel, monitor_id=None):
         """
-    def removeMonitor(self, channel, subchannel):
+        :param monitor_id: monitor to remove, None to remove every monitor of the channel or subchannel
+                           (of the whole channel if subchannel is None)
+        """
+        self.compiled = None
         if channel in self.monitors:
-            if subchannel is None:  # no subchannel, remove whole thing
-                monitor = self.monitors.pop(channel)
-                del monitor
+            if monitor_id is not None:
+                signal = self.monitors[channel].get(subchannel, {})
+                if monitor_id in signal:
+                    signal.pop(monitor_id)
+                    self._forget(monitor_id)
+                    if not len(signal):
+                        self.monitors[channel].pop(subchannel)
+                    if not len(self.monitors[channel]):
+                        self.monitors.pop(channel)
+                    return
+            elif subchannel is None:  # no subchannel, remove whole thing
+                for signal in self.monitors.pop(channel).values():
+                    for monitor_id in signal:
+                        self._forget(monitor_id)
                 return
-            if subchannel in self.monitors[channel]:
-                monitor = self.monitors[channel].pop(subchannel)
-                del monitor
+            elif subchannel in self.monitors[channel]:
+                for monitor_id in self.monitors[channel].pop(subchannel):
+                    self._forget(monitor_id)
+                if not len(self.monitors[channel]):
+                    self.monitors.pop(channel)
                 return
-        logging.warning(f"Cannot remove monitor of channel {channel} subchannel {subchannel} because it does not exist")
+        logging.warning(f"Cannot remove monitor {'' if monitor_id is None else monitor_id + ' '}of channel {channel} subchannel {subchannel} because it does not exist")
+
+    def _seed(self, channel, subchannel, monitor):
         """
-        if subchannel:
-            if channel in self.monitors:
-                if subchannel in self.monitors[channel]:
-                    monitor = self.monitors[channel].pop(subchannel)
-                    del monitor
-        elif channel in self.monitors:
-            monitor = self.monitors.pop(channel)
-            del monitor
+        Feeds a new trend monitor the history the FileManager already holds, so it is not blind for a whole window
+        after a restart or an edit
         """
+        fileManager = getattr(self.parent, 'fileManager', None)
+        logChannel = fileManager.logChannels.get(channel) if fileManager is not None else None
+        if logChannel is None or logChannel.data.last_time is None:
+            return
+        store = logChannel.data
+        # Twice the window, so monitors comparing to the sample a window old have one
+        for times, values in store.window(store.last_time - 2 * monitor.seconds, subchannel=subchannel):
+            monitor.seed(times, values)
+
+    def _forget(self, monitor_id):
+        self.signals.pop(monitor_id, None)
+        self.severities.pop(monitor_id, None)
+
+    def getMonitor(self, monitor_id):
+        channel, subchannel = self.signals[monitor_id]
+        return self.monitors[channel][subchannel][monitor_id]
 
     def checkMonitors(self, signaledValues):
-        ret = {}
-        for channel, data in signaledValues.items():
-            if channel in self.monitors:
-                ret[channel] = {}
-                for time, v in data.items():
-                    if time is None:
-                        logging.warning(f"{channel} had a change but did not read correctly")
-                        continue
-                    if type(v) == dict:
-                        for subchannel, value in v.items():
-                            if subchannel in self.monitors[channel]:
-                                monitorValue = self.monitors[channel][subchannel].checkValue(value)
-                                if channel in ret and subchannel in ret[channel]:
-                                    ret[channel][subchannel] = ret[channel][subchannel] or monitorValue
-                                else:
-                                    ret[channel][subchannel] = monitorValue
-                    else:
-                        if None in self.monitors[channel]:
-                            monitorValue = self.monitors[channel][None].checkValue(v)
-                            if channel in ret:
-                                ret[channel] = ret[channel] or monitorValue
-                            else:
-                                ret[channel] = monitorValue
-                        else:
-                            logging.error(f"{channel} with subchannels had an invalid read")
+        """
+        Checks every new sample of the changed channels against the compiled monitor index, a column at a time.
+        Monitors of the same channel or subchannel are checked against one shared column
+
+        :param signaledValues: {channel: SampleBatch}
+        :return: {monitor id: triggered} for the monitors of the changed channels
+        """
+        if self.compiled is None:
+            self.compiled = CompiledMonitors(self.monitors)
+        ret = self.compiled.evaluate(signaledValues)
         return ret
 
         """
@@ -93,40 +126,46 @@ class MonitorManager():
         return ret
         """
 
-    def triggeredMonitorInfo(self, signaledValues, triggeredMonitors):
+    def triggeredMonitorInfo(self, signaledValues, triggeredMonitors, severities=None):
+        """
+        :param triggeredMonitors: monitor ids, from WhatMonitorsTriggered
+        :param severities: {monitor id: severity} overriding the ones the monitors were added with (escalated alerts)
+        :return: {channel: {subchannel: info}} or {channel: info} for single value channels, where info holds the
+                 'currentValue' samples, the 'monitor' description, the triggered 'monitors' ids and their highest 'severity'.
+                 Monitors of channels without new samples (alerts still going on) have no current values
+        """
         ret = {}
-        for tup in triggeredMonitors:
-            if type(tup) != tuple:
-                tup = (tup, None)
-            channel, subchannel = tup
-            if channel not in signaledValues:
-                logging.error(f"Monitor {channel if subchannel is None else channel+':'+subchannel} was triggered but can not find it in signaled values")
+        for monitor_id in triggeredMonitors:
+            if monitor_id not in self.signals:
+                logging.error(f"Monitor {monitor_id} was triggered but is no longer active")
                 continue
+            channel, subchannel = self.signals[monitor_id]
+            batch = signaledValues.get(channel)
             if channel not in ret:
                 ret[channel] = {}
-            if subchannel:
-                ret[channel][subchannel] = {
-                    'currentValue':{t:v[subchannel] for t,v in signaledValues[channel].items() if (t and v and subchannel in v)},
-                    'monitor':str(self.monitors[channel][subchannel]), # TODO: make extra safe?
-                }
+            if subchannel is not None:
+                if subchannel not in ret[channel]:
+                    ret[channel][subchannel] = {
+                        'currentValue':{t:v[subchannel] for t,v in batch.items() if (t and v and subchannel in v)} if batch is not None else {},
+                    }
+                info = ret[channel][subchannel]
             else:
-                ret[channel] = {
-                    'currentValue':list(signaledValues[channel].items()), # To differentiate it from one with subchannels
-                    'monitor':str(self.monitors[channel][subchannel]),
-                }
+                if 'currentValue' not in ret[channel]:
+                    ret[channel]['currentValue'] = list(batch.items()) if batch is not None else [] # To differentiate it from one with subchannels
+                info = ret[channel]
+            self._addTriggered(info, monitor_id, (severities or {}).get(monitor_id, self.severities[monitor_id]))
         return ret
 
-
+    def _addTriggered(self, info, monitor_id, severity):
+        description = f"{self.getMonitor(monitor_id)} ({severity})"
+        info['monitors'] = info.get('monitors', []) + [monitor_id]
+        info['monitor'] = f"{info['monitor']} and {description}" if 'monitor' in info else description
+        if 'severity' not in info or MONITOR_SEVERITIES.index(severity) > MONITOR_SEVERITIES.index(info['severity']):
+            info['severity'] = severity
 
     @staticmethod
     def WhatMonitorsTriggered(monitorCheckRet):
-        triggered = []
-        for channel, data in monitorCheckRet.items():
-            if type(data) == dict:
-                for subchannel, value in data.items():
-                    if value:
-                        triggered.append((channel, subchannel))
-            else:
-                if data:
-                    triggered.append(channel) # No need for none or tuple, only monitorManager class uses None as dictionary key
-        return triggered
\ No newline at end of file
+        """
+        :return: ids of the monitors that triggered
+        """
+        return [monitor_id for monitor_id, triggered in monitorCheckRet.items() if triggered]
@@ -0,0 +1,60 @@
+"""
+Least recently used cache of parsed log files, invalidated when a file's size or modification time changes
+"""
+import threading
+from collections import OrderedDict
+
+
+class ParsedFileCache:
+    def __init__(self, limit_bytes):
+        """
+        :param limit_bytes: estimated memory the cached results may use, 0 disables the cache
+        """
+        self.limit_bytes = limit_bytes
+        self.entries = OrderedDict()  # path -> (size, mtime_ns, value, estimated bytes), least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, stat):
+        """
+        :param path: file the value was parsed from
+        :param stat: current os.stat_result of the file
+        :return: cached value, None if missing or parsed from an older version of the file
+        """
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, path, stat, value, estimated_bytes):
+        with self._lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.bytes -= old[3]
+            if estimated_bytes > self.limit_bytes:
+                return
+            self.entries[path] = (stat.st_size, stat.st_mtime_ns, value, estimated_bytes)
+            self.bytes += estimated_bytes
+            while self.bytes > self.limit_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted[3]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.bytes, 'limit_bytes': self.limit_bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def __len__(self):
+        return len(self.entries)
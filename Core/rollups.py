@@ -0,0 +1,282 @@
+"""
+Downsampled min/max/mean/count buckets of numeric channels, so long time spans can be served without raw samples
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+import os
+import json
+import threading
+from array import array
+from datetime import datetime
+import logger
+from Core.logArchive import LogArchive
+from Core.logQuery import LogQuery
+
+logging = logger.Logger(__file__)
+
+
+def _is_number(value):
+    return type(value) == float or type(value) == int
+
+
+class DayRollup:
+    """
+    Buckets of one channel-day: {resolution: {subchannel: {bucket start: [min, max, sum, count]}}}.
+    Single value channels use the None subchannel. Samples at or before last_time are already counted
+    """
+    def __init__(self, resolutions = ROLLUP_RESOLUTIONS):
+        self.resolutions = sorted(resolutions)
+        self.buckets = {r: {} for r in self.resolutions}
+        self.last_time = None
+        self.complete = False  # built from the whole file of a closed day, never changes again
+
+    def add(self, t, value):
+        if self.last_time is not None and t <= self.last_time:
+            return
+        self.last_time = t
+        items = value.items() if type(value) == dict else ((None, value),)
+        for subchannel, v in items:
+            if not _is_number(v) or v != v:
+                continue
+            for resolution, buckets in self.buckets.items():
+                column = buckets.get(subchannel)
+                if column is None:
+                    column = buckets[subchannel] = {}
+                start = t - t % resolution
+                bucket = column.get(start)
+                if bucket is None:
+                    column[start] = [v, v, v, 1]
+                else:
+                    if v < bucket[0]:
+                        bucket[0] = v
+                    if v > bucket[1]:
+                        bucket[1] = v
+                    bucket[2] += v
+                    bucket[3] += 1
+
+    def add_column(self, subchannel, times, values):
+        """
+        Adds a whole column at once: the finest resolution is bucketed from the samples,
+        coarser ones are merged from the finest buckets
+        """
+        finest = {}
+        for t, v in zip(times, values):
+            if not _is_number(v) or v != v:
+                continue
+            start = t - t % self.resolutions[0]
+            bucket = finest.get(start)
+            if bucket is None:
+                finest[start] = [v, v, v, 1]
+            else:
+                if v < bucket[0]:
+                    bucket[0] = v
+                if v > bucket[1]:
+                    bucket[1] = v
+                bucket[2] += v
+                bucket[3] += 1
+        if not finest:
+            return
+        self.buckets[self.resolutions[0]][subchannel] = finest
+        for resolution in self.resolutions[1:]:
+            column = self.buckets[resolution][subchannel] = {}
+            for start, (lo, hi, total, count) in finest.items():
+                coarse = start - start % resolution
+                bucket = column.get(coarse)
+                if bucket is None:
+                    column[coarse] = [lo, hi, total, count]
+                else:
+                    bucket[0] = min(bucket[0], lo)
+                    bucket[1] = max(bucket[1], hi)
+                    bucket[2] += total
+                    bucket[3] += count
+        if len(times):
+            self.last_time = max(self.last_time or times[-1], times[-1])
+
+    def to_json(self):
+        return {
+            'complete': self.complete,
+            'last_time': self.last_time,
+            'resolutions': {str(r): [[subchannel, [[start, *bucket] for start, bucket in column.items()]]
+                                     for subchannel, column in buckets.items()] for r, buckets in self.buckets.items()},
+        }
+
+    @classmethod
+    def FromJson(cls, contents):
+        rollup = cls([int(r) for r in contents['resolutions']])
+        rollup.complete = contents['complete']
+        rollup.last_time = contents['last_time']
+        for r, columns in contents['resolutions'].items():
+            rollup.buckets[int(r)] = {subchannel: {row[0]: row[1:] for row in rows} for subchannel, rows in columns}
+        return rollup
+
+
+class RollupStore:
+    """
+    Rollups of every channel-day. Closed days are built from the whole file the first time they are needed
+    and saved under ROLLUP_PATH/<channel>/<date>.json. The day being written is built from its file on first
+    use and then kept current with the batches the FileManager reads
+    """
+    def __init__(self, log_path = LOG_PATH, rollup_path = ROLLUP_PATH, archive = None, history = None):
+        self.log_path = log_path
+        self.rollup_path = rollup_path
+        self.archive = archive or LogArchive(log_path)
+        self.history = history or LogQuery(log_path, archive=self.archive)
+        self.days = {}  # (channel, date) -> DayRollup
+        self.pending = {}  # (channel, date) -> samples read while its rollup is being built, replayed once it is in days
+        self.lock = threading.Lock()
+
+    def _file(self, channel, date):
+        return os.path.join(self.rollup_path, channel, f"{date}.json")
+
+    def _today(self):
+        return datetime.now().strftime(DATE_FORMAT)
+
+    def add(self, channel, date, batch):
+        """
+        Counts newly read samples into the day, if its rollup is in use
+        """
+        with self.lock:
+            rollup = self.days.get((channel, date))
+            if rollup is None:
+                pending = self.pending.get((channel, date))
+                if pending is not None:
+                    pending.extend(batch.items())
+                return
+            if rollup.complete:
+                return
+            for t, value in batch.items():
+                rollup.add(t, value)
+
+    def start(self, channel, date):
+        """
+        Starts an empty rollup for a day file that is only beginning, the FileManager then adds its samples as they are read
+        """
+        with self.lock:
+            if (channel, date) not in self.days and (channel, date) not in self.pending:
+                self.days[(channel, date)] = DayRollup()
+
+    def _build(self, channel, date):
+        archive = self.archive.open(channel, date)
+        rollup = DayRollup()
+        if archive is not None:
+            times = archive.times()
+            for subchannel in archive.columns:
+                rollup.add_column(subchannel, times, archive.column(subchannel))
+            return rollup
+        try:
+            data, labels = self.archive.read(channel, date, use_cache=date < self._today()) # Not the growing file of today
+        except FileNotFoundError:
+            return rollup
+        times = list(data.keys())
+        if any(type(v) == dict for v in data.values()):
+            subchannels = dict.fromkeys(k for v in data.values() if type(v) == dict for k in v)
+            for subchannel in subchannels:
+                rollup.add_column(subchannel, times, [v.get(subchannel) if type(v) == dict else None for v in data.values()])
+        else:
+            rollup.add_column(None, times, list(data.values()))
+        return rollup
+
+    def day(self, channel, date):
+        """
+        Loading or building a day can parse a whole file, so it runs outside the lock and add() keeps going meanwhile.
+        Samples added during the build are replayed into the rollup when it is put in days
+
+        :return: DayRollup of a channel-day, loaded or built if needed
+        """
+        key = (channel, date)
+        with self.lock:
+            rollup = self.days.get(key)
+            if rollup is not None:
+                return rollup
+            self.pending.setdefault(key, [])
+        closed = date < self._today()
+        fname = self._file(channel, date)
+        if closed and self.rollup_path and os.path.exists(fname):
+            try:
+                with open(fname, 'r') as f:
+                    rollup = DayRollup.FromJson(json.load(f))
+            except Exception as e:
+                logging.warning(f"Cannot load rollup {fname}, rebuilding it: {str(e)}")
+        try:
+            if rollup is None or sorted(rollup.buckets) != sorted(ROLLUP_RESOLUTIONS):
+                rollup = self._build(channel, date)
+                rollup.complete = closed
+                if closed:
+                    self._save(fname, rollup)
+        except Exception:
+            with self.lock:
+                if key not in self.days:
+                    self.pending.pop(key, None)
+            raise
+        with self.lock:
+            existing = self.days.get(key)
+            if existing is not None:
+                return existing # Built by another query meanwhile
+            if not rollup.complete:
+                for t, value in self.pending.get(key, ()):
+                    rollup.add(t, value) # Skips samples the file already had
+            self.pending.pop(key, None)
+            self.days[key] = rollup
+            return rollup
+
+    def _save(self, fname, rollup):
+        if not self.rollup_path:
+            return
+        temp = f"{fname}.tmp"
+        try:
+            os.makedirs(os.path.dirname(fname), exist_ok=True)
+            with open(temp, 'w') as f:
+                json.dump(rollup.to_json(), f)
+            os.replace(temp, fname)
+        except Exception as e:
+            logging.error(f"Cannot save rollup {fname}: {str(e)}")
+
+    def resolution_for(self, t0, t1, max_points = ROLLUP_MAX_POINTS):
+        """
+        :return: coarsest needed resolution in seconds to show t0..t1 with at most max_points, 0 for raw samples
+        """
+        span = t1 - t0
+        if span <= max_points * ROLLUP_RAW_INTERVAL:
+            return 0
+        for resolution in sorted(ROLLUP_RESOLUTIONS):
+            if span / resolution <= max_points:
+                return resolution
+        return max(ROLLUP_RESOLUTIONS)
+
+    def query(self, channel, subchannel, t0, t1, max_points = ROLLUP_MAX_POINTS):
+        """
+        Values of a subchannel between t0 and t1 at a resolution picked from the span
+
+        :return: resolution (0 for raw samples), {'time', 'min', 'max', 'mean', 'count'} arrays.
+                 time is the start of each bucket, raw samples have min = max = mean and a count of 1
+        """
+        resolution = self.resolution_for(t0, t1, max_points)
+        if resolution == 0:
+            times, values = self.history.query(channel, subchannel, t0, t1)
+            keep = [i for i, v in enumerate(values) if _is_number(v)]
+            values = array('d', [values[i] for i in keep])
+            return 0, {'time': array('d', [times[i] for i in keep]), 'min': values, 'max': values, 'mean': values,
+                       'count': array('q', [1]) * len(keep)}
+
+        merged = {}
+        for date in self.history.dates_between(t0, t1):
+            column = self.day(channel, date).buckets[resolution].get(subchannel, {})
+            with self.lock:
+                rows = [(start, list(bucket)) for start, bucket in column.items() if start + resolution > t0 and start <= t1]
+            for start, bucket in rows:
+                # A bucket crossing midnight has samples in both day files
+                previous = merged.get(start)
+                if previous is None:
+                    merged[start] = bucket
+                else:
+                    merged[start] = [min(previous[0], bucket[0]), max(previous[1], bucket[1]),
+                                     previous[2] + bucket[2], previous[3] + bucket[3]]
+        starts = sorted(merged)
+        buckets = [merged[start] for start in starts]
+        return resolution, {
+            'time': array('d', starts),
+            'min': array('d', [b[0] for b in buckets]),
+            'max': array('d', [b[1] for b in buckets]),
+            'mean': array('d', [b[2] / b[3] for b in buckets]),
+            'count': array('q', [b[3] for b in buckets]),
+        }
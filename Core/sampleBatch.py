@@ -0,0 +1,59 @@
+"""
+New samples of one channel, passed from the FileManager to the GUI and monitors in one piece
+"""
+from array import array
+
+
+class SampleBatch:
+    """
+    Parallel time/value columns. Values are scalars, or dictionaries of subchannel values.
+    items() yields (time, value) pairs like the {time: value} dictionaries used elsewhere
+    """
+    __slots__ = ('times', 'values', '_columns')
+
+    def __init__(self, times=(), values=()):
+        self.times = array('d', times)
+        self.values = list(values)
+        self._columns = {}
+
+    @classmethod
+    def FromDict(cls, data):
+        return cls(data.keys(), data.values())
+
+    def extend(self, other):
+        self.times.extend(other.times)
+        self.values.extend(other.values)
+        self._columns = {}
+
+    def column(self, subchannel):
+        """
+        :return: values of one subchannel, None where a sample does not have it
+        """
+        try:
+            return self._columns[subchannel]
+        except KeyError:
+            column = self._columns[subchannel] = [v.get(subchannel) if type(v) == dict else None for v in self.values]
+            return column
+
+    def subchannels(self):
+        """
+        :return: subchannels present in the batch, in order of appearance (empty for single value channels)
+        """
+        return list(dict.fromkeys(k for v in self.values if type(v) == dict for k in v))
+
+    def last(self):
+        if len(self.times):
+            return self.times[-1], self.values[-1]
+        return None, None
+
+    def items(self):
+        return zip(self.times, self.values)
+
+    def keys(self):
+        return iter(self.times)
+
+    def __len__(self):
+        return len(self.times)
+
+    def __repr__(self):
+        return f"SampleBatch({dict(self.items())})"
@@ -0,0 +1,323 @@
+"""
+Fixed capacity columnar history of a channel
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+from array import array
+from bisect import bisect_left, bisect_right
+import logger
+
+logging = logger.Logger(__file__)
+
+class _Missing:
+    def __reduce__(self):
+        return '_MISSING' # Stays the same object when channels are pickled to and from loader processes
+
+    def __repr__(self):
+        return '_MISSING'
+
+_MISSING = _Missing() # Placeholder in object columns for samples without that subchannel
+_NAN = float('nan')
+_ARRAY_TYPES = {'q': int, 'd': float}
+
+
+class ChannelStore:
+    """
+    Ring buffer of (time, value) samples stored column by column: one array('d') of times and one column per
+    subchannel (None for single value channels). Columns holding only ints or only floats are array('q') or array('d'),
+    anything else is a list.
+
+    Storage grows with the samples until capacity is reached, then the oldest sample is overwritten in O(1).
+    Iterating yields (time, value) pairs oldest first, with dictionaries rebuilt for channels with subchannels.
+    A subchannel missing from a sample is NaN in float columns, so a logged NaN subchannel value reads back as missing.
+
+    Times never go backwards: a sample older than the newest one is dropped (and counted in dropped), which keeps
+    the history sorted for bisecting and lets latest() answer in O(1).
+
+    The first sample decides the shape of the channel: a dictionary where the channel holds single values, or the other
+    way around, is logged and dropped (and counted in rejected) instead of changing how the stored samples read back.
+    """
+    def __init__(self, capacity = MAXIMUM_DATAPOINT_HISTORY):
+        self.capacity = capacity
+        self.last_time = None
+        self.latest_values = {}  # subchannel -> (time, value) of the newest sample that had it
+        self.dropped = 0
+        self.rejected = 0
+        self._clear()
+
+    def _clear(self):
+        self.times = array('d')
+        self.columns = {}
+        self.start = 0  # slot of the oldest sample once the buffer wrapped
+        self.size = 0
+        self.has_subchannels = False
+
+    def _new_column(self, value, length):
+        # Samples before this one did not have the column, they get placeholders
+        if type(value) == float:
+            return array('d', [_NAN]) * length
+        if type(value) == int and not length:
+            return array('q')
+        return [_MISSING] * length
+
+    def _promote(self, subchannel):
+        """
+        turns a column into a plain list once it has to hold anything else than its own numeric type
+        """
+        column = self.columns[subchannel]
+        if column.typecode == 'd':
+            column = [_MISSING if v != v else v for v in column]
+        else:
+            column = list(column)
+        self.columns[subchannel] = column
+        return column
+
+    def _store(self, column_key, slot, value, growing):
+        column = self.columns.get(column_key)
+        if column is None:
+            column = self.columns[column_key] = self._new_column(value, len(self.times) - 1 if growing else len(self.times))
+        elif type(column) != list and type(value) != _ARRAY_TYPES[column.typecode]:
+            # Arrays would silently turn ints into floats, values come back exactly as they were appended
+            column = self._promote(column_key)
+        try:
+            if growing:
+                column.append(value)
+            else:
+                column[slot] = value
+        except OverflowError:
+            column = self._promote(column_key)
+            if growing:
+                column.append(value)
+            else:
+                column[slot] = value
+
+    def _reject(self, t, value):
+        if not self.rejected: # Once per store, a misbehaving file would repeat it on every line
+            logging.warning(f"Dropped a sample at {t} that {'has' if type(value) == dict else 'does not have'} subchannels, "
+                            f"unlike the samples stored before it: {value}")
+        self.rejected += 1
+
+    def append(self, t, value):
+        if self.last_time is not None and t < self.last_time:
+            self.dropped += 1
+            return
+        if self.size and (type(value) == dict) != self.has_subchannels:
+            self._reject(t, value)
+            return
+        self.last_time = t
+        if self.size < self.capacity:
+            slot, growing = self.size, True
+            self.times.append(t)
+            self.size += 1
+        else:
+            slot, growing = self.start, False
+            self.times[slot] = t
+            self.start = (self.start + 1) % self.capacity
+
+        if type(value) == dict:
+            self.has_subchannels = True
+            for subchannel, v in value.items():
+                self._store(subchannel, slot, v, growing)
+                self.latest_values[subchannel] = (t, v)
+            if len(value) != len(self.columns):
+                for key in [k for k in self.columns if k not in value]:
+                    self._fill_missing(key, slot, growing)
+        else:
+            self._store(None, slot, value, growing)
+            self.latest_values[None] = (t, value)
+            if len(self.columns) != 1:
+                for key in [k for k in self.columns if k is not None]:
+                    self._fill_missing(key, slot, growing)
+
+    def _fill_missing(self, key, slot, growing):
+        column = self.columns[key]
+        if type(column) != list and column.typecode == 'q':
+            column = self._promote(key)
+        placeholder = _NAN if type(column) != list else _MISSING
+        if growing:
+            column.append(placeholder)
+        else:
+            column[slot] = placeholder
+
+    def extend(self, samples):
+        """
+        Appends many samples. Batches that fit before the buffer wraps, like the first read of a day file,
+        are added column by column instead of one sample at a time
+        """
+        ordered = []
+        last = self.last_time
+        for sample in samples:
+            if last is not None and sample[0] < last:
+                self.dropped += 1
+                continue
+            ordered.append(sample)
+            last = sample[0]
+        samples = ordered
+        if len(samples) >= self.capacity:
+            # Only the newest capacity samples survive, start over from an empty buffer
+            for t, value in samples[:len(samples) - self.capacity]:
+                for subchannel, v in (value.items() if type(value) == dict else ((None, value),)):
+                    self.latest_values[subchannel] = (t, v)
+            samples = samples[len(samples) - self.capacity:]
+            self._clear()
+        if self.size + len(samples) > self.capacity or self.start != 0:
+            for t, value in samples:
+                self.append(t, value)
+            return
+        if not samples:
+            return
+        times, values = zip(*samples)
+        if any(type(value) == dict for value in values):
+            if not all(type(value) == dict for value in values) or (self.size and not self.has_subchannels):
+                for t, value in samples:
+                    self.append(t, value)
+                return
+            self.has_subchannels = True
+            keys = dict.fromkeys(self.columns)
+            for value in values:
+                keys.update(dict.fromkeys(value))
+            new_columns = {key: [value.get(key, _MISSING) for value in values] for key in keys}
+        elif self.has_subchannels:
+            for t, value in samples:
+                self.append(t, value)
+            return
+        else:
+            new_columns = {None: list(values)}
+
+        for key, column in new_columns.items():
+            self._extend_column(key, column)
+            for i in range(len(column) - 1, -1, -1):
+                if column[i] is not _MISSING:
+                    self.latest_values[key] = (times[i], column[i])
+                    break
+        self.times.extend(times)
+        self.size += len(times)
+        self.last_time = times[-1]
+
+    def prepend(self, samples):
+        """
+        Puts samples older than the first stored one in front of the history, the newest of them if they do not all
+        fit. The columns are rebuilt but the store stays the same object, so everything holding it keeps seeing new samples
+
+        :param samples: (time, value) in time order
+        """
+        first = self.times[self.start] if self.size else None
+        older = [sample for sample in samples if first is None or sample[0] < first]
+        if self.size and any((type(v) == dict) != self.has_subchannels for _, v in older):
+            for t, v in older:
+                if (type(v) == dict) != self.has_subchannels:
+                    self._reject(t, v)
+            older = [(t, v) for t, v in older if (type(v) == dict) == self.has_subchannels]
+        room = self.capacity - self.size
+        if room <= 0 or not older:
+            return
+        merged = ChannelStore(self.capacity)
+        merged.extend(older[-room:])
+        merged.extend(list(self))
+        self.dropped += merged.dropped
+        self.times, self.columns, self.start, self.size, self.has_subchannels, self.last_time, self.latest_values = \
+            merged.times, merged.columns, merged.start, merged.size, merged.has_subchannels, merged.last_time, merged.latest_values
+
+    def _extend_column(self, key, values):
+        kinds = set(map(type, values))
+        if kinds == {int}:
+            try:
+                values = array('q', values)
+            except OverflowError:
+                pass
+        elif kinds == {float} or kinds == {float, _Missing}:
+            values = array('d', [_NAN if v is _MISSING else v for v in values])
+        column = self.columns.get(key)
+        if column is None:
+            if not self.size:
+                self.columns[key] = values
+                return
+            # Samples already stored did not have the column
+            column = self.columns[key] = self._new_column(values[0] if type(values) != list else None, self.size)
+        if type(column) != list and (type(values) == list or values.typecode != column.typecode):
+            column = self._promote(key)
+        if type(column) == list and type(values) != list and values.typecode == 'd':
+            values = [_MISSING if v != v else v for v in values]
+        column.extend(values)
+
+    def _slots(self):
+        # Physical slot ranges in logical order
+        if self.start == 0:
+            return [(0, self.size)]
+        return [(self.start, self.size), (0, self.start)]
+
+    def _value(self, slot):
+        if not self.has_subchannels:
+            return self.columns[None][slot]
+        value = {}
+        for key, column in self.columns.items():
+            v = column[slot]
+            if v is _MISSING or (v != v and type(column) != list): # NaN placeholder
+                continue
+            value[key] = v
+        return value
+
+    def __len__(self):
+        return self.size
+
+    def latest(self, subchannel = None):
+        """
+        :param subchannel: subchannel to look up, None for the whole newest sample
+        :return: (time, value) of the newest sample (that has the subchannel), (None, None) if there is none
+        """
+        if subchannel is None and self.has_subchannels:
+            if not self.size:
+                return None, None
+            slot = (self.start + self.size - 1) % self.capacity
+            return self.times[slot], self._value(slot)
+        return self.latest_values.get(subchannel, (None, None))
+
+    def __iter__(self):
+        for begin, end in self._slots():
+            for slot in range(begin, end):
+                yield self.times[slot], self._value(slot)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("ChannelStore index out of range")
+        slot = (self.start + index) % self.capacity
+        return self.times[slot], self._value(slot)
+
+    def tail(self, n):
+        """
+        :return: list of the last n (time, value) samples
+        """
+        return self[max(self.size - n, 0):]
+
+    def views(self, subchannel = None):
+        """
+        Copies of the history, oldest first. There are two segments once the buffer wrapped.
+        Copies rather than memoryviews, since an array exporting a buffer cannot grow and the store keeps appending
+
+        :return: list of (times, values) array slices (list slices for non numeric columns)
+        """
+        return self.window(subchannel=subchannel)
+
+    def window(self, t0 = None, t1 = None, subchannel = None):
+        """
+        History restricted to t0 <= time <= t1, assuming samples were appended in time order.
+        Only the samples in the window are copied
+
+        :return: list of (times, values) slices like views()
+        """
+        column = self.columns.get(subchannel)
+        if column is None:
+            return []
+        ret = []
+        for begin, end in self._slots():
+            if t0 is not None:
+                begin = bisect_left(self.times, t0, begin, end)
+            if t1 is not None:
+                end = bisect_right(self.times, t1, begin, end)
+            if begin < end:
+                ret.append((self.times[begin:end], column[begin:end]))
+        return ret
@@ -0,0 +1,60 @@
+"""
+Decoders for the 'dd-mm-yy,HH:MM:SS' timestamp at the start of every log row
+"""
+import localvars
+localvars.load_globals(localvars, globals())
+from datetime import datetime, timedelta
+
+
+class StrptimeTimestampDecoder:
+    """
+    Reference decoder, parses the whole date and time with strptime on every call
+    """
+    def __call__(self, date_str, time_str):
+        return datetime.strptime(f'{date_str} {time_str}', '%d-%m-%y %H:%M:%S').timestamp()
+
+
+class CachedTimestampDecoder:
+    """
+    Decodes the date part once per day string and adds the H:M:S offset to the local midnight epoch.
+
+    Days that are not exactly 24h long (DST transitions in the local timezone) are flagged when first seen
+    and fall back to strptime, so results are always identical to StrptimeTimestampDecoder.
+    """
+    def __init__(self, max_days=1024):
+        self.max_days = max_days
+        self.days = {}  # date string -> local midnight epoch, or None if the day has a DST transition
+        self.strptime = StrptimeTimestampDecoder()
+
+    def day(self, date_str):
+        midnight = datetime.strptime(date_str, '%d-%m-%y')
+        start = midnight.timestamp()
+        if (midnight + timedelta(days=1)).timestamp() - start != 86400:
+            start = None  # DST change, offsets from midnight are not wall clock time
+        if len(self.days) >= self.max_days:
+            self.days.clear()
+        self.days[date_str] = start
+        return start
+
+    def __call__(self, date_str, time_str):
+        try:
+            start = self.days[date_str]
+        except KeyError:
+            start = self.day(date_str)
+        if start is None or len(time_str) != 8 or time_str[2] != ':' or time_str[5] != ':':
+            return self.strptime(date_str, time_str)
+        hours, minutes, seconds = int(time_str[:2]), int(time_str[3:5]), int(time_str[6:])
+        if not (0 <= hours <= 23 and 0 <= minutes <= 59 and 0 <= seconds <= 59):
+            raise ValueError(f"time data '{date_str} {time_str}' is out of range")
+        return start + hours * 3600 + minutes * 60 + seconds
+
+
+TIMESTAMP_DECODERS = {
+    'strptime': StrptimeTimestampDecoder,
+    'cached': CachedTimestampDecoder,
+}
+
+def get_timestamp_decoder(name = TIMESTAMP_DECODER):
+    if name not in TIMESTAMP_DECODERS:
+        raise ValueError(f"Unknown timestamp decoder {name}, must be one of {', '.join(TIMESTAMP_DECODERS.keys())}")
+    return TIMESTAMP_DECODERS[name]()
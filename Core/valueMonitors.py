@@ -1,6 +1,11 @@
 """
 # This is where all monitors are stored and values are checked
 """
+import operator
+import time
+from collections import deque
+import localvars
+localvars.load_globals(localvars, globals())
 
 class AbstractMonitor:
 
@@ -15,6 +20,45 @@ class AbstractMonitor:
         """
         pass
 
+    def compile(self):
+        """
+        Optional. Returns a predicate over a whole column of new values, equivalent to any(map(self.checkValue, column))
+        but with the monitor's settings already resolved. Monitors without it are checked value by value
+
+        :return: function(column) -> boolean
+        """
+        pass
+
+    def compile_extremes(self):
+        """
+        Optional. Returns the same check decided from the minimum and maximum of a column of numbers without NaN.
+        Several monitors on one subchannel then share a single min/max of the column
+
+        :return: function(minimum, maximum) -> boolean
+        """
+        pass
+
+    def holding(self, margin):
+        """
+        Optional. Returns a copy of the monitor whose triggering region is larger by margin (a fraction of each
+        threshold). A firing alert is checked against it, so it only clears once values moved clear of the threshold
+
+        :return: monitor
+        """
+        pass
+
+    def checkSamples(self, times, values):
+        """
+        Optional, for monitors that keep state between samples (trends over time). Every new sample of the channel
+        is passed once, oldest first, and the monitor updates its state from it without looking back at the history.
+        Monitors with it are never checked through checkValue or compile
+
+        :param times: timestamps of the new samples
+        :param values: new values, same length as times
+        :return: boolean, True if any of the samples triggers the monitor
+        """
+        pass
+
     def __str__(self):
         """
         This will appear in the alert string, in the form of:
@@ -24,6 +68,10 @@ class AbstractMonitor:
         :return: string to attach with alert
         """
 
+def _shift(bound, margin):
+    # Moves a threshold outwards by margin of itself, None stays None
+    return bound if bound is None else bound + abs(bound) * margin
+
 class InRangeMonitor: # Single monitor
     def __init__(self, minimum, maximum, inclusive=True):
         self.minimum = minimum
@@ -48,6 +96,41 @@ class InRangeMonitor: # Single monitor
                 return value < self.maximum
         return False
 
+    def compile(self):
+        minimum, maximum = self.minimum, self.maximum
+        below = operator.le if self.inclusive else operator.lt
+        if minimum is None and maximum is None:
+            return lambda column: False
+        if minimum is not None and maximum is not None:
+            if self.inclusive:
+                return lambda column: any(minimum <= v <= maximum for v in column)
+            return lambda column: any(minimum < v < maximum for v in column)
+        # With one bound the extreme of the column decides. max/min skip NaNs (never in range) unless the column starts with one
+        if minimum is not None:
+            def check(column):
+                extreme = max(column)
+                if extreme == extreme:
+                    return below(minimum, extreme)
+                return any(below(minimum, v) for v in column)
+            return check
+        def check(column):
+            extreme = min(column)
+            if extreme == extreme:
+                return below(extreme, maximum)
+            return any(below(v, maximum) for v in column)
+        return check
+
+    def compile_extremes(self):
+        minimum, maximum = self.minimum, self.maximum
+        below = operator.le if self.inclusive else operator.lt
+        if minimum is None and maximum is None:
+            return lambda lo, hi: False
+        if minimum is not None and maximum is not None:
+            return None # Values between the extremes decide
+        if minimum is not None:
+            return lambda lo, hi: below(minimum, hi)
+        return lambda lo, hi: below(lo, maximum)
+
     def __str__(self):
         operator = "<=" if self.inclusive else "<"
         minimum = self.minimum if self.minimum is not None else "-inf"
@@ -55,6 +138,9 @@ class InRangeMonitor: # Single monitor
 
         return f"in range {minimum} {operator} value {operator} {maximum}"
 
+    def holding(self, margin):
+        return InRangeMonitor(_shift(self.minimum, -margin), _shift(self.maximum, margin), self.inclusive)
+
 class OutRangeMonitor: # Single monitor
     def __init__(self, minimum, maximum, inclusive=True):
         self.minimum = minimum
@@ -78,6 +164,29 @@ class OutRangeMonitor: # Single monitor
                 return not value < self.maximum
         return True
 
+    def compile(self):
+        minimum, maximum = self.minimum, self.maximum
+        below = operator.le if self.inclusive else operator.lt
+        if minimum is None and maximum is None:
+            return lambda column: len(column) > 0
+        def exact(column):
+            return any(not ((minimum is None or below(minimum, v)) and (maximum is None or below(v, maximum))) for v in column)
+        extremes = self.compile_extremes()
+        def check(column):
+            # NaN is out of every range but invisible to min/max, a NaN (or inf - inf) sum sends the column to the exact check
+            total = sum(column)
+            if total != total:
+                return exact(column)
+            return extremes(min(column), max(column))
+        return check
+
+    def compile_extremes(self):
+        minimum, maximum = self.minimum, self.maximum
+        below = operator.le if self.inclusive else operator.lt
+        if minimum is None and maximum is None:
+            return lambda lo, hi: True
+        return lambda lo, hi: (minimum is not None and not below(minimum, lo)) or (maximum is not None and not below(hi, maximum))
+
     def __str__(self):
         operator = "<=" if self.inclusive else "<"
         minimum = self.minimum if self.minimum is not None else "-inf"
@@ -85,6 +194,12 @@ class OutRangeMonitor: # Single monitor
 
         return f"out of range {minimum} {operator} value {operator} {maximum}"
 
+    def holding(self, margin):
+        minimum, maximum = _shift(self.minimum, margin), _shift(self.maximum, -margin)
+        if minimum is not None and maximum is not None and minimum > maximum:
+            minimum = maximum = (self.minimum + self.maximum) / 2 # Range narrower than the margins
+        return OutRangeMonitor(minimum, maximum, self.inclusive)
+
 
 class EqualMonitor:
     def __init__(self, value):
@@ -93,6 +208,10 @@ class EqualMonitor:
     def checkValue(self, value):
         return value == self.value
 
+    def compile(self):
+        target = self.value
+        return lambda column: target in column
+
     def __str__(self):
         return f"equal to {self.value}"
 
@@ -103,6 +222,10 @@ class NotEqualMonitor:
     def checkValue(self, value):
         return not (value == self.value)
 
+    def compile(self):
+        target = self.value
+        return lambda column: column.count(target) != len(column)
+
     def __str__(self):
         return f"not equal to {self.value}"
 
@@ -113,6 +236,9 @@ class NullMonitor:
     def checkValue(self, value):
         return False
 
+    def compile(self):
+        return lambda column: False
+
     def __str__(self):
         return "Null Monitor"
 
@@ -124,6 +250,9 @@ class OnMonitor:
     def checkValue(self, value):
         return bool(value) == True
 
+    def compile(self):
+        return any
+
     def __str__(self):
         return f"on"
 
@@ -134,9 +263,229 @@ class OffMonitor:
     def checkValue(self, value):
         return bool(value) == False
 
+    def compile(self):
+        return lambda column: not all(column)
+
     def __str__(self):
         return f"off"
 
+def _is_number(value):
+    return (type(value) == float or type(value) == int) and value == value
+
+
+def _outside(value, minimum, maximum):
+    return (minimum is not None and value < minimum) or (maximum is not None and value > maximum)
+
+
+def _bounds(minimum, maximum, name):
+    minimum = minimum if minimum is not None else "-inf"
+    maximum = maximum if maximum is not None else "inf"
+    return f"{minimum} <= {name} <= {maximum}"
+
+
+class StatefulMonitor:
+    """
+    Base of the monitors of trends over time. Subclasses implement checkSample(t, value), called once per sample
+    in time order with numbers only; samples not newer than the last one are skipped
+    """
+    def __init__(self, minutes):
+        self.minutes = minutes if minutes is not None else TREND_MONITOR_MINUTES
+        self.seconds = self.minutes * 60
+        self.first_time = None
+        self.last_time = None
+
+    def ready(self, t):
+        """
+        :return: True once the monitor has seen a whole window of samples
+        """
+        return t - self.first_time >= self.seconds
+
+    def checkSamples(self, times, values):
+        triggered = False
+        last_time = self.last_time
+        for t, value in zip(times, values):
+            if not _is_number(value) or (last_time is not None and t <= last_time):
+                continue
+            last_time = self.last_time = t
+            if self.first_time is None:
+                self.first_time = t
+            if self.checkSample(t, value):
+                triggered = True
+        return triggered
+
+    def checkValue(self, value):
+        return self.checkSamples((time.time(),), (value,))
+
+    def seed(self, times, values):
+        """
+        Feeds stored history through the monitor so it does not start with an empty window, the result is ignored
+        """
+        self.checkSamples(times, values)
+
+
+class RunningWindow:
+    """
+    Samples of the last `seconds` with running sums, for means and least squares slopes in O(1) per sample.
+    Times are summed relative to an origin, and the sums are recomputed from the kept samples (moving the origin
+    to the oldest one) once as many samples were evicted as are kept, so rounding cannot build up
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = deque()
+        self.origin = None
+        self.evicted = 0
+        self.n, self.st, self.sv, self.stt, self.stv = 0, 0.0, 0.0, 0.0, 0.0
+
+    def push(self, t, value):
+        if self.origin is None:
+            self.origin = t
+        x = t - self.origin
+        self.samples.append((t, value))
+        self.n += 1
+        self.st += x
+        self.sv += value
+        self.stt += x * x
+        self.stv += x * value
+        samples, start = self.samples, t - self.seconds
+        while samples[0][0] < start:
+            old_t, old_value = samples.popleft()
+            x = old_t - self.origin
+            self.n -= 1
+            self.st -= x
+            self.sv -= old_value
+            self.stt -= x * x
+            self.stv -= x * old_value
+            self.evicted += 1
+        if self.evicted > len(samples):
+            self._recompute()
+
+    def _recompute(self):
+        self.origin = self.samples[0][0]
+        self.evicted = 0
+        self.n, self.st, self.sv, self.stt, self.stv = 0, 0.0, 0.0, 0.0, 0.0
+        for t, value in self.samples:
+            x = t - self.origin
+            self.n += 1
+            self.st += x
+            self.sv += value
+            self.stt += x * x
+            self.stv += x * value
+
+    def mean(self):
+        return self.sv / self.n
+
+    def slope(self):
+        """
+        :return: least squares slope in units per second, None with less than two distinct times
+        """
+        denominator = self.n * self.stt - self.st * self.st
+        if self.n < 2 or denominator <= 0:
+            return None
+        return (self.n * self.stv - self.st * self.sv) / denominator
+
+
+class SlopeMonitor(StatefulMonitor):
+    def __init__(self, minutes, minimum, maximum):
+        super().__init__(minutes)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = RunningWindow(self.seconds)
+
+    def checkSample(self, t, value):
+        self.window.push(t, value)
+        if not self.ready(t):
+            return False
+        slope = self.window.slope()
+        return slope is not None and _outside(slope * 60, self.minimum, self.maximum)
+
+    def __str__(self):
+        return f"changing at a rate out of range {_bounds(self.minimum, self.maximum, 'rate per minute')} over {self.minutes} min"
+
+class MeanMonitor(StatefulMonitor):
+    def __init__(self, minutes, minimum, maximum):
+        super().__init__(minutes)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = RunningWindow(self.seconds)
+
+    def checkSample(self, t, value):
+        self.window.push(t, value)
+        return self.ready(t) and _outside(self.window.mean(), self.minimum, self.maximum)
+
+    def __str__(self):
+        return f"averaging out of range {_bounds(self.minimum, self.maximum, 'mean')} over {self.minutes} min"
+
+class DeltaMonitor(StatefulMonitor):
+    def __init__(self, minutes, minimum, maximum):
+        super().__init__(minutes)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.samples = deque()  # The first one is the newest sample at least `minutes` old, once there is one
+
+    def checkSample(self, t, value):
+        samples = self.samples
+        samples.append((t, value))
+        start = t - self.seconds
+        while len(samples) > 1 and samples[1][0] <= start:
+            samples.popleft()
+        reference_time, reference = samples[0]
+        return reference_time <= start and _outside(value - reference, self.minimum, self.maximum)
+
+    def __str__(self):
+        return f"changed by an amount out of range {_bounds(self.minimum, self.maximum, 'change')} in {self.minutes} min"
+
+class SwingMonitor(StatefulMonitor):
+    def __init__(self, minutes, rise, fall):
+        super().__init__(minutes)
+        self.rise = rise
+        self.fall = fall
+        # Monotonic deques, the lowest and highest sample of the window are always first
+        self.lows = deque()
+        self.highs = deque()
+
+    def checkSample(self, t, value):
+        lows, highs, start = self.lows, self.highs, t - self.seconds
+        while lows and lows[-1][1] >= value:
+            lows.pop()
+        lows.append((t, value))
+        while lows[0][0] < start:
+            lows.popleft()
+        while highs and highs[-1][1] <= value:
+            highs.pop()
+        highs.append((t, value))
+        while highs[0][0] < start:
+            highs.popleft()
+        return (self.rise is not None and value - lows[0][1] >= self.rise) or (self.fall is not None and highs[0][1] - value >= self.fall)
+
+    def __str__(self):
+        conditions = []
+        if self.rise is not None:
+            conditions.append(f"risen by at least {self.rise}")
+        if self.fall is not None:
+            conditions.append(f"fallen by at least {self.fall}")
+        return f"{' or '.join(conditions) or 'swinging'} within {self.minutes} min"
+
+class TimeBeyondMonitor(StatefulMonitor):
+    def __init__(self, threshold, minutes, above=True):
+        super().__init__(minutes)
+        self.threshold = threshold
+        self.above = above
+        self.since = None  # Time of the first sample of the current run beyond the threshold
+
+    def checkSample(self, t, value):
+        if self.threshold is None:
+            return False
+        beyond = value > self.threshold if self.above else value < self.threshold
+        if not beyond:
+            self.since = None
+            return False
+        if self.since is None:
+            self.since = t
+        return t - self.since >= self.seconds
+
+    def __str__(self):
+        return f"{'above' if self.above else 'below'} {self.threshold} for at least {self.minutes} min"
+
 MONITORS = {
     'InRangeMonitor': {
         'type':InRangeMonitor,
@@ -187,7 +536,37 @@ MONITORS = {
         'type':OffMonitor,
         'variables':{},
         'values':{},
-    }
+    },
+    'SlopeOutRange':{
+        'type':SlopeMonitor,
+        'variables':{'minutes':float, 'minimum':float, 'maximum':float},
+        'values':{},
+    },
+    'DeltaOutRange':{
+        'type':DeltaMonitor,
+        'variables':{'minutes':float, 'minimum':float, 'maximum':float},
+        'values':{},
+    },
+    'MeanOutRange':{
+        'type':MeanMonitor,
+        'variables':{'minutes':float, 'minimum':float, 'maximum':float},
+        'values':{},
+    },
+    'SwingWithin':{
+        'type':SwingMonitor,
+        'variables':{'minutes':float, 'rise':float, 'fall':float},
+        'values':{},
+    },
+    'TimeAbove':{
+        'type':TimeBeyondMonitor,
+        'variables':{'threshold':float, 'minutes':float},
+        'values':{'above':True},
+    },
+    'TimeBelow':{
+        'type':TimeBeyondMonitor,
+        'variables':{'threshold':float, 'minutes':float},
+        'values':{'above':False},
+    },
 }
 
 
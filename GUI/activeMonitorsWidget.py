@@ -6,6 +6,7 @@ import logger
 logging = logger.Logger(__file__)
 
 from Core.valueMonitors import *
+from Core.monitorManager import signal_name
 from GUI.monitorWidget import MonitorWidgetSelect
 import localvars
 localvars.load_globals(localvars, globals())
@@ -69,7 +70,7 @@ class MonitorTable(QtCore.QAbstractTableModel):
         return False
 
     def addMonitor(self, obj):
-        row = [obj['monitor'], getMonitorString(obj['type'], obj['values'], obj['variables'])]
+        row = [obj['monitor'], f"{getMonitorString(obj['type'], obj['values'], obj['variables'])} ({obj.get('severity', DEFAULT_MONITOR_SEVERITY)})"]
         if obj['monitor'] in self._monitors:
             self.removeMonitor(obj)
         idx = self.addRow(row)
@@ -120,8 +121,12 @@ class ActiveMonitorEdit(QtWidgets.QDialog):
         self.monitor_combobox.setPlaceholderText('Select Monitor Type')
         self.monitor_combobox.addItems(MONITORS.keys())
         self.monitor_combobox.setCurrentText(self.monitor['name'])
+        self.severity_combobox = QtWidgets.QComboBox(self)
+        self.severity_combobox.addItems(MONITOR_SEVERITIES)
+        self.severity_combobox.setCurrentText(self.monitor.get('severity', DEFAULT_MONITOR_SEVERITY))
 
         self.form_layout.addRow("Active", self.active_checkbox)
+        self.form_layout.addRow("Severity", self.severity_combobox)
         self.form_layout.addRow("Monitor", self.monitor_combobox)
         # Populate combobox and variables
         self.monitorTypeChanged(self.monitor['name'])  # Make it draw the text boxes
@@ -142,6 +147,7 @@ class ActiveMonitorEdit(QtWidgets.QDialog):
     def getModifiedData(self):
         monitorName = self.monitor_combobox.currentText()
         ret = self.monitor.copy()
+        ret['severity'] = self.severity_combobox.currentText()
         if monitorName not in MONITORS:
             ret['active'] = False # We want to disable it if invalid
             return ret
@@ -192,15 +198,19 @@ class ActiveMonitorsWidget(QtWidgets.QWidget):
         #self.table_view.setSizeAdjustPolicy(QtWidgets.QTableView.SizeAdjustPolicy.AdjustToContents)
         self.resizeTableSections()
 
+        self.add_btn = QtWidgets.QPushButton('Add Monitor To Channel')
         self.edit_btn = QtWidgets.QPushButton('Edit Monitor')
         self.remove_btn = QtWidgets.QPushButton('Remove Monitor')
+        self.add_btn.clicked.connect(self.addBtnCallback)
         self.edit_btn.clicked.connect(self.editBtnCallback)
         self.remove_btn.clicked.connect(self.removeBtnCallback)
         self.layout.addWidget(self.table_view)
+        self.layout.addWidget(self.add_btn)
         self.layout.addWidget(self.edit_btn)
         self.layout.addWidget(self.remove_btn)
         self.setLayout(self.layout)
 
+        self.add_btn.setEnabled(True)
         self.edit_btn.setEnabled(True)
         self.remove_btn.setEnabled(True)
 
@@ -264,6 +274,36 @@ class ActiveMonitorsWidget(QtWidgets.QWidget):
             self.monitorChange.emit(obj)
 
 
+    def newMonitorId(self, obj):
+        """
+        :return: first free id for another monitor on the channel or subchannel of obj, like CH6 T #2
+        """
+        name = signal_name(obj['channel'], obj['subchannel'])
+        number = 2
+        while f"{name}{EXTRA_MONITOR_DELIMITER}{number}" in self.table._monitors:
+            number += 1
+        return f"{name}{EXTRA_MONITOR_DELIMITER}{number}"
+
+    def addBtnCallback(self, event):
+        """
+        Adds another monitor, with its own id and severity, to the channel or subchannel of the selected monitor.
+        The monitor widget of a channel only holds one, this is how warning and critical bands are set up together
+        """
+        indexes = self.table_view.selectionModel().selectedRows()
+        if not len(indexes):
+            logging.warning("Select a monitor of the channel to add another monitor to")
+            return
+        obj = self.table.getMonitor(indexes[0])
+        if obj is None:
+            return
+        new_obj = obj.copy()
+        new_obj['monitor'] = self.newMonitorId(obj)
+        new_obj['variables'] = dict(obj['variables'])
+        dialog = ActiveMonitorEdit(self, new_obj)
+        dialog.setWindowTitle(f"Add monitor {new_obj['monitor']}")
+        if dialog.exec_() == QtWidgets.QDialog.Accepted:
+            self.monitorChange.emit(dialog.getModifiedData())
+
     def editBtnCallback(self, event):
         indexes = self.table_view.selectionModel().selectedRows()
         for index in sorted(indexes, reverse=True):
@@ -302,6 +342,7 @@ class ActiveMonitorsWidget(QtWidgets.QWidget):
             ret[name] = {
                 k:obj[k] for k in ['monitor', 'channel', 'subchannel', 'name', 'variables']
             }
+            ret[name]['severity'] = obj.get('severity', DEFAULT_MONITOR_SEVERITY)
         return ret
 
     def importMonitors(self, monitor_infos):
@@ -322,6 +363,7 @@ class ActiveMonitorsWidget(QtWidgets.QWidget):
                 'name': info['name'],
                 'variables': info['variables'],  # tuple for range, value for fixed
                 'values': MONITORS[info['name']]['values'],
+                'severity': info.get('severity', DEFAULT_MONITOR_SEVERITY),
             })
         for monitor in monitors:
             self.monitorChange.emit(monitor)
@@ -134,6 +134,7 @@ class MonitorWidget(QtWidgets.QWidget):
         self.subchannel = subchannel
         self.parent = parent
         self.parse_function = parse_function
+        self.severity = localvars.DEFAULT_MONITOR_SEVERITY # Kept from loaded or edited monitors
         self.checkbox = QtWidgets.QCheckBox()
 
         self.monitor_label = QtWidgets.QLabel()
@@ -183,7 +184,8 @@ class MonitorWidget(QtWidgets.QWidget):
             'type':self.monitor_type.getType(), # 'range' or 'fixed'
             'name':self.monitor_type.getMonitorType(),
             'variables':self.monitor_type.getVariableValues(), # tuple for range, value for fixed
-            'values':MONITORS[self.monitor_type.getMonitorType()]['values']
+            'values':MONITORS[self.monitor_type.getMonitorType()]['values'],
+            'severity':self.severity,
         }
 
         self.monitorSignal.emit(change)
@@ -234,6 +236,7 @@ class MonitorWidget(QtWidgets.QWidget):
             )
             self.checkbox.blockSignals(False)
 
+        self.severity = obj.get('severity', self.severity)
         self.monitor_type.monitorStatusChange.emit(obj['active'])
         self.monitor_type.monitorChange(obj)
         change = {
@@ -245,6 +248,7 @@ class MonitorWidget(QtWidgets.QWidget):
             'name': self.monitor_type.getMonitorType(),
             'variables': self.monitor_type.getVariableValues(),  # tuple for range, value for fixed
             'values': MONITORS[self.monitor_type.getMonitorType()]['values'],
+            'severity': self.severity,
         }
         #print("Working", change)
         self.monitorSignal.emit(change)
@@ -24,16 +24,19 @@ class MonitorsWidget(QtWidgets.QWidget):
         super().__init__()
         self.collapsableBoxes = {}
         self.allMonitors = {}
+        self.monitorNames = set()  # Ids of the monitors set from a MonitorWidget
         self.processedChanges.connect(self.processChangesCallback)
+        self.monitorChange.connect(self.monitorChangeCallback)
         self.values = None
 
     def init_ui(self, values):
         self.values = values
         justify = {ch_type: 0 for ch_type in MONITOR_CHANNELS.keys()}
+        latest = {} # Newest sample of every channel, the stores keep it so this does not depend on the history length
         for ch_type, channels in MONITOR_CHANNELS.items():
             for channel in channels:
                 try:
-                    t, value = sorted(self.values[channel], key=lambda x: x[0])[-1]
+                    t, value = latest[channel] = self.values[channel].latest()
                 except Exception as e:
                     logging.error(f"Encountered an error while trying to find last values: {str(e)}")
                     t, value = 0, None
@@ -51,7 +54,7 @@ class MonitorsWidget(QtWidgets.QWidget):
                 self.allMonitors[channel] = {}  # Can be overwritten
                 # print(self.values.keys())
                 try:
-                    t, value = sorted(self.values[channel], key=lambda x: x[0])[-1]
+                    t, value = latest[channel]
                 except Exception as e:
                     logging.error(f"Encountered an error while trying to find last values: {str(e)}")
                     t, value = 0, None
@@ -72,6 +75,7 @@ class MonitorsWidget(QtWidgets.QWidget):
                         mw.changeValue(t, v)
                         layout.addWidget(mw)
                         self.allMonitors[channel][subchannel] = mw
+                        self.monitorNames.add(ch)
                 else:
                     mw = MonitorWidget(
                         name=channel,
@@ -86,6 +90,7 @@ class MonitorsWidget(QtWidgets.QWidget):
                     mw.changeValue(t, value)
                     layout.addWidget(mw)
                     self.allMonitors[channel] = mw
+                    self.monitorNames.add(channel)
 
             self.collapsableBoxes[ch_type].setContentLayout(layout)
 
@@ -95,38 +100,49 @@ class MonitorsWidget(QtWidgets.QWidget):
         self.main_layout.addStretch()
         self.setLayout(self.main_layout)
 
+    def monitorChangeCallback(self, obj):
+        """
+        Extra monitors of a channel have no MonitorWidget of their own, they are passed on as they are.
+        The MonitorWidgets handle the others
+        """
+        if obj['monitor'] in self.monitorNames:
+            return
+        self.monitorSignal.emit(obj)
+
     def processChangesCallback(self, obj):
         """
         This occurs when fileManager processes a change
-        :param obj: change object
+        :param obj: change object, {channel: SampleBatch}
         :return: None
         """
-        if all([all([k is None and v is None for k,v in vals.items()]) for keys, vals in obj.items()]):
-            logging.warning(f"All None object emitted by fileManager: {str(obj)}")
+        if all([len(batch) == 0 for batch in obj.values()]):
+            logging.warning(f"Empty change object emitted by fileManager: {str(obj)}")
             return
         try:
-            for channel, values_object in obj.items():
+            for channel, batch in obj.items():
                 if channel not in self.allMonitors:
                     logging.error(f"Invalid channel found: {channel}")
                     continue
-                for time, values in values_object.items():
-                    if type(values) == dict:
-                        for subchannel, value in values.items():
-                            if subchannel not in self.allMonitors[channel]:
-                                logging.error(f"Invalid subchannel found: {channel}:{subchannel}")
-                                continue
-                            try:
-                                self.allMonitors[channel][subchannel].changeValue(time, value)
-                            except Exception as e:
-                                logging.error(f"Could not change value of {channel}:{subchannel} to {value} at {time}: {str(e)}")
+                time, values = batch.last() # Only the latest sample is displayed
+                if time is None:
+                    continue
+                if type(values) == dict:
+                    for subchannel, value in values.items():
+                        if subchannel not in self.allMonitors[channel]:
+                            logging.error(f"Invalid subchannel found: {channel}:{subchannel}")
+                            continue
+                        try:
+                            self.allMonitors[channel][subchannel].changeValue(time, value)
+                        except Exception as e:
+                            logging.error(f"Could not change value of {channel}:{subchannel} to {value} at {time}: {str(e)}")
+                else:
+                    if type(self.allMonitors[channel]) == dict:
+                        logging.error(f"Invalid value for channel {channel}: {values}")
                     else:
-                        if type(self.allMonitors[channel]) == dict:
-                            logging.error(f"Invalid value for channel {channel}: {values}")
-                        else:
-                            try:
-                                self.allMonitors[channel].changeValue(time, values)
-                            except Exception as e:
-                                logging.error(f"Could not change value of {channel} to {values} at {time}: {str(e)}")
+                        try:
+                            self.allMonitors[channel].changeValue(time, values)
+                        except Exception as e:
+                            logging.error(f"Could not change value of {channel} to {values} at {time}: {str(e)}")
 
         except Exception as e:
             logging.error(f"While processing changes: {str(e)}")
@@ -68,7 +68,32 @@ MONITOR_CHANNELS = {
 TABULATE_TABLE_FMT = 'fancy_grid'  # See here for options: https://pypi.org/project/tabulate/
 INDENT_EMAIL_INFORMATION = False
 
-MAXIMUM_DATAPOINT_HISTORY = 300
+MAXIMUM_DATAPOINT_HISTORY = 86400 # Samples kept in memory per channel, a day of 1 Hz logging
+TAIL_BUFFER_SIZE = 65536 # Bytes read at once when tailing a log file
+PARSED_FILE_CACHE_BYTES = 268435456 # Estimated memory for whole parsed log files kept by read_log_file, 0 to disable
+PARSED_ROW_BYTES = 100 # Estimated size of a parsed row besides its values
+PARSED_VALUE_BYTES = 80 # Estimated size of each value of a parsed row
+MAPPED_READ_CHUNK_ROWS = 8192 # Rows of a past day file parsed at once, bounds the memory used by split lines
+
+DIRECTORY_INDEX_FILE = 'directory_index.json' # Cache of the latest date folder of every channel, empty to always scan the whole log path
+CHECKPOINT_FILE = 'checkpoints.json' # Where read positions are saved so restarts resume instead of re-parsing, empty to disable
+CHECKPOINT_TAIL_LENGTH = 300 # Number of recent samples saved per channel
+ARCHIVE_PATH = 'archive' # Where past days are compacted into columnar binary files (see Core/logArchive.py), empty to disable
+QUERY_INDEX_STRIDE = 256 # Lines between two entries of the byte offset index used for time range queries
+QUERY_INDEX_FILES = 64 # Log files whose byte offset index is kept, least recently queried ones are dropped
+ROLLUP_PATH = 'rollups' # Where min/max/mean buckets of closed days are saved (see Core/rollups.py), empty to keep them in memory only
+ROLLUP_RESOLUTIONS = [60, 600, 3600] # Bucket sizes in seconds
+ROLLUP_MAX_POINTS = 2000 # Queries pick the finest resolution that keeps the result under this many points
+ROLLUP_RAW_INTERVAL = 1 # Expected seconds between raw samples, spans short enough to stay under ROLLUP_MAX_POINTS are served raw
+CHECKPOINT_INTERVAL = 60 # Seconds between checkpoint saves while running (they are also saved on stop)
+
+BACKFILL_HOURS = 24 # History loaded from earlier date folders at startup, capped by MAXIMUM_DATAPOINT_HISTORY per channel. 0 to disable
+LOAD_WORKERS = 0 # Processes used to load channels at startup, 0 for one per core and 1 to load everything in a single thread
+LOAD_PARALLEL_MIN_BYTES = 1048576 # Channels with less than this left to parse are loaded directly instead of in a loader process
+
+LOG_PARSER_ENGINE = 'bulk' # 'line' parses row by row, 'bulk' converts whole columns at once (see Core/fileReader.py PARSER_ENGINES)
+TIMESTAMP_DECODER = 'cached' # 'strptime' parses every row, 'cached' decodes each day once (see Core/timestampDecoder.py)
+CHANNEL_COLUMN_TYPES = {} # Optional declared value column types per channel, e.g. {'heaters': ['str', 'float']} (repeated to fit the row). Undeclared channels learn them from their first row
 MAX_COLLAPSEABLE_HEIGHT = 400
 
 FIX_CONSOLE_HEIGHT = True
@@ -76,6 +101,31 @@ FIX_ACTIVE_WIDTH = True
 
 SEND_TEST_EMAIL_ON_LAUNCH = False
 
+MONITOR_SEVERITIES = ['info', 'warning', 'critical'] # Least to most severe, several monitors on one channel can each have their own
+DEFAULT_MONITOR_SEVERITY = 'warning' # Severity of monitors that do not set one
+EXTRA_MONITOR_DELIMITER = ' #' # Between the channel[:subchannel] name and the number of its extra monitors, as in CH6 T #2
+TREND_MONITOR_MINUTES = 10 # Window of trend monitors (slope, change, mean...) left without one
+
+# Alerts are only emailed when they start, escalate, are still going after ALERT_RENOTIFY_SECONDS or clear
+ALERT_DEBOUNCE_SECONDS = 10 # A monitor must stay triggered this long before alerting, 0 to alert on the first trigger
+ALERT_CLEAR_SECONDS = 60 # ...and stay quiet this long before its alert clears, so a value wavering around a threshold keeps a single alert
+ALERT_CLEAR_MARGIN = 0.05 # A firing range monitor only counts as quiet once values are back past its thresholds by this fraction of them, 0 for none
+ALERT_RENOTIFY_SECONDS = 3600 # Reminder interval of an alert still going on, 0 to disable
+ALERT_ESCALATION_SECONDS = 1800 # An alert going on this long is raised to the next severity (again after as long), 0 to disable
+ALERT_SUBJECTS = {'info': '[INFO] BlueFors Alert Triggered', 'warning': '[URGENT] BlueFors Alert Triggered!', 'critical': '[CRITICAL] BlueFors Alert Triggered!'} # Email subject by highest severity
+ALERT_RESOLVED_SUBJECT = '[RESOLVED] BlueFors Alert Cleared' # Subject of emails only reporting cleared alerts
+
+# Emails are sent from a background thread (see Core/mailQueue.py)
+SMTP_USE_SSL = True # False for plain SMTP, e.g. a local test server
+MAIL_BATCH_SECONDS = 5 # Emails queued within this many seconds of the first are sent as one
+MAIL_BATCH_SEPARATOR = '\n' + '-' * 60 + '\n' # Between the bodies of batched emails
+MAIL_IDLE_SECONDS = 300 # The SMTP connection is closed after being unused this long
+MAIL_TIMEOUT = 30 # Seconds before an unresponsive SMTP server counts as a failure
+MAIL_RETRIES = 5 # Attempts after the first before an email is dropped
+MAIL_RETRY_SECONDS = 5 # Wait before the first retry, doubled after each failure...
+MAIL_RETRY_MAX_SECONDS = 300 # ...up to this
+MAIL_STOP_TIMEOUT = 10 # Seconds given to the mail thread to send what is queued when closing
+
 SPLIT_MONITOR_WIDGETS = True # This will make it so monitor selector is left, active monitors are right, and console is full bottom
 # If false, monitor will be top left, console will be bottom left, and active monitor will be entirely right
 
@@ -89,7 +139,11 @@ CONFIGTYPE_FIELDS_EMAIL = ['RECIPIENTS']
 CONFIG_MAILER_FIELDS = ['RECIPIENTS', 'SENDER', 'PASSWORD', 'SMTP_SERVER', 'SMTP_PORT']
 
 
-CHANGE_PROCESS_CHECK = 1 # Number of seconds between checking for changes (We do this instead of immediate processing because many files sometimes get modified concurrently and we want as accurate a result as possible when a monitor goes off
+MIDNIGHT_ROLLOVER_DELAY = 1 # Seconds after midnight to look for the new date folder, in case it was created before the watch caught it
+# Changes are batched instead of processed immediately because many files sometimes get modified concurrently and we want as accurate a result as possible when a monitor goes off
+CHANGE_QUIET_PERIOD = 0.1 # A batch is emitted once no file changed for this many seconds...
+CHANGE_MAX_LATENCY = 1 # ...or this many seconds after its first change...
+CHANGE_MAX_BATCH = 200 # ...or once this many file reads are in it, whichever comes first
 ICON_PATH = 'Resources/BlueforsIcon.ico'
 
 def load_globals(module, global_dict):
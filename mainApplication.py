@@ -7,7 +7,8 @@ import localvars
 from Core.configurationManager import ConfigurationManager, does_config_file_exist, refresh_all_modules
 from itertools import zip_longest
 
-if not does_config_file_exist():
+# Loader processes re-import this module as __mp_main__ on Windows, only the real launch may open dialogs or touch stdout
+if __name__ == "__main__" and not does_config_file_exist():
     # No configuration file!!! Do something
     from GUI.configurationWidgets import NewConfigurationDialogue
     import sys
@@ -45,6 +46,7 @@ from Core.fileManager import *
 from Core.mailer import Mailer
 from Core.fileManager import FileManager
 from Core.monitorManager import MonitorManager
+from Core.alertManager import AlertManager
 
 from GUI.collapsibleBox import CollapsibleBox
 from GUI.monitorWidget import MonitorWidget
@@ -54,10 +56,13 @@ from GUI.activeMonitorsWidget import ActiveMonitorsWidget
 from GUI.consoleWidget import Printerceptor, ConsoleWidget
 import sys
 import json
-sys.stdout = stdout = Printerceptor()
-if sys.platform == 'win32':
-    import ctypes
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID('bluefors.monitor.app.1')
+import multiprocessing
+stdout = None # Printerceptor, installed by the first MainApplication
+if __name__ == "__main__":
+    multiprocessing.freeze_support() # Frozen builds start loader processes through this executable
+    if sys.platform == 'win32':
+        import ctypes
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID('bluefors.monitor.app.1')
 import logger
 
 RESTART_EXIT_CODE = 12 # Should not be used
@@ -75,22 +80,25 @@ class MainApplication(QtWidgets.QMainWindow):
     def __init__(self, log_path=localvars.LOG_PATH):
         super().__init__()
         # Initialize the console widget and connect stdout to console to capture init prints
+        global stdout
+        if stdout is None:
+            sys.stdout = stdout = Printerceptor()
         self.consoleWidget = ConsoleWidget()
         stdout.printToConsole.connect(self.consoleWidget.printToConsole)
-        self.fileManager = FileManager(log_path)
+        self.fileManager = FileManager(log_path, background_load=True)
         self.monitorsWidget = MonitorsWidget()
         self.monitorManager = MonitorManager(self)
         self.activeMonitorWidget = ActiveMonitorsWidget()
 
 
         self.mailer = Mailer(localvars.RECIPIENTS)
-        self.values = self.fileManager.dumpData()
-
-
-        if localvars.SEND_TEST_EMAIL_ON_LAUNCH:
-            self.mailer.send_test(self.fileManager.currentStatus())
+        self.alertManager = AlertManager(self.monitorManager, self.mailer)
+        self.values = {}
+        self.pending_monitor_file = None # Monitors can only be loaded once channels are loaded
 
-        self.monitorsWidget.init_ui(self.values)
+        # Channels load in the background, the monitors are built once they are all read
+        self.fileManager.loadProgress.connect(self.loadProgressCallback)
+        self.fileManager.loadFinished.connect(self.loadFinishedCallback)
 
         # connect file manager so we can process changes in monitorsWidget and check for alerts
         self.fileManager.processedChanges.connect(self.monitorsWidget.processChangesCallback)
@@ -126,6 +134,9 @@ class MainApplication(QtWidgets.QMainWindow):
 
 
     def load_monitors(self, fname='history.monitor'):
+        if not self.fileManager.loaded:
+            self.pending_monitor_file = fname
+            return
         if os.path.exists(fname):
             with open(fname, 'r') as f:
                 try:
@@ -135,6 +146,8 @@ class MainApplication(QtWidgets.QMainWindow):
                     logging.warning(f"Cannot load monitor history: {str(e)}")
 
     def export_monitors(self, fname='history.monitor'):
+        if not self.fileManager.loaded: # Nothing could have been activated, keep the old history
+            return
         with open(fname, 'w') as f:
             monitorHistory = self.activeMonitorWidget.exportMonitors()
             if len(monitorHistory.keys()) > 0:
@@ -194,25 +207,36 @@ class MainApplication(QtWidgets.QMainWindow):
 
 
     def init_threads(self):
+        self.statusBar().showMessage("Loading log channels...")
+        self.fileManager.startLoading()
+
+    def loadProgressCallback(self, loaded, total):
+        self.statusBar().showMessage(f"Loading log channels ({loaded}/{total})")
+
+    def loadFinishedCallback(self):
+        self.values = self.fileManager.dumpData()
+        self.monitorsWidget.init_ui(self.values)
+        self.resizeWidgets()
+        self.statusBar().showMessage(f"Loaded {len(self.values)} log channels", 5000)
+
+        if localvars.SEND_TEST_EMAIL_ON_LAUNCH:
+            self.mailer.send_test(self.fileManager.currentStatus())
+
+        if self.pending_monitor_file:
+            self.load_monitors(fname=self.pending_monitor_file)
+            self.pending_monitor_file = None
         self.fileManager.start()
 
     def close_threads(self):
         self.fileManager.stop()
         self.fileManager.wait()
+        self.mailer.stop()
 
     def checkMonitors(self, obj):
         try:
             vals = self.monitorManager.checkMonitors(obj)
-            triggered = (self.monitorManager.WhatMonitorsTriggered(vals))
-            triggered_data = self.monitorManager.triggeredMonitorInfo(obj, triggered)
-            if len(vals.items()) and len(triggered):
-                logging.info(f"Alerts triggered: {', '.join([':'.join(x) if type(x) != str else x for x in triggered])}")
-            # if len(vals.items()):
-            #    print(vals)
-            if len(triggered) > 0:
-                print(f"Alerts triggered: {', '.join([':'.join(x) if type(x) != str else x for x in triggered])}")
-                # print(triggered_data)
-                self.mailer.send_alert(triggered_data, self.fileManager.currentStatus())
+            # Only alerts that start, escalate, need a reminder or clear are emailed
+            self.alertManager.process(obj, vals, self.fileManager.currentStatus)
         except Exception as e:
             logging.error(f"An error occured while checking monitors: {str(e)}")
             print(f"{str(e)}:{traceback.format_exc()}")
@@ -227,11 +251,11 @@ class MainApplication(QtWidgets.QMainWindow):
         """
 
         if obj['active']:
-            self.monitorManager.addMonitor(channel=obj['channel'], subchannel=obj['subchannel'], type=obj['type'], values=obj['values'], variables=obj['variables'])
+            self.monitorManager.addMonitor(channel=obj['channel'], subchannel=obj['subchannel'], type=obj['type'], values=obj['values'], variables=obj['variables'], monitor_id=obj['monitor'], severity=obj.get('severity', localvars.DEFAULT_MONITOR_SEVERITY))
             logging.info(f"Monitor {obj['monitor']} activated, (channel={obj['channel']}, subchannel={obj['subchannel']}, type={obj['type']}, values={obj['values']}, variables={obj['variables']})")
             print(f"Monitor {obj['monitor']} activated")
         else:
-            self.monitorManager.removeMonitor(channel=obj['channel'], subchannel=obj['subchannel'])
+            self.monitorManager.removeMonitor(channel=obj['channel'], subchannel=obj['subchannel'], monitor_id=obj['monitor'])
             logging.info(f"Monitor {obj['monitor']} deactivated, (channel={obj['channel']}, subchannel={obj['subchannel']}, type={obj['type']}, values={obj['values']}, variables={obj['variables']})")
             print(f"Monitor {obj['monitor']} deactivated")
 
@@ -0,0 +1,89 @@
+# Benchmarks the log file parser engines on synthetic files made with the log_file_generator row functions
+# Run from the repository root: python tests/benchmark_file_reader.py [engines|timestamps] [rows]
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import localvars
+from log_file_generator import single_channel, kv_channel, channel_channel, very_large_channel, maxigauge_channel
+from Core.fileReader import read_log_file, PARSER_ENGINES
+from Core.timestampDecoder import TIMESTAMP_DECODERS
+
+DATE = datetime(2024, 6, 3)
+
+BENCHMARK_CHANNELS = {
+    'CH6 T': single_channel,
+    'Status': kv_channel,
+    'Channels': channel_channel,
+    'heaters': very_large_channel,
+    'maxigauge': maxigauge_channel,
+}
+
+def write_synthetic_log(log_path, channel, row_function, rows, start=DATE):
+    folder = start.strftime(localvars.DATE_FORMAT)
+    os.makedirs(os.path.join(log_path, folder), exist_ok=True)
+    if channel in localvars.CHANNELS_WITH_UNDERSCORE:
+        fname = f'{channel}_{folder}.log'
+    else:
+        fname = f'{channel} {folder}.log'
+    with open(os.path.join(log_path, folder, fname), 'w') as f:
+        for i in range(rows):
+            t = start + timedelta(seconds=i)
+            row = row_function(t.strftime('%d-%m-%y'), t.strftime('%H:%M:%S'))
+            f.write("%s\n" % (",".join([str(x) for x in row])))
+    return folder
+
+def time_call(function, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def benchmark_engines(rows=20000):
+    with tempfile.TemporaryDirectory() as log_path:
+        for channel, row_function in BENCHMARK_CHANNELS.items():
+            date = write_synthetic_log(log_path, channel, row_function, rows)
+            results = {}
+            for engine in PARSER_ENGINES.keys():
+                elapsed, results[engine] = time_call(lambda: read_log_file(channel, date, log_path=log_path, engine=engine, use_cache=False))
+                print(f"{channel:>10} {engine:>6}: {rows / elapsed:>12,.0f} lines/s")
+            reference = results['line']
+            for engine, result in results.items():
+                if result != reference:
+                    print(f"{channel:>10} {engine:>6}: OUTPUT DIFFERS FROM LINE ENGINE")
+
+def benchmark_timestamp_decoders(rows=1000000):
+    # Starts just before the end of european summer time so DST days are part of the comparison when TZ is set
+    start = datetime(2024, 10, 20)
+    with tempfile.TemporaryDirectory() as log_path:
+        date = write_synthetic_log(log_path, 'CH6 T', single_channel, rows, start=start)
+        with open(os.path.join(log_path, date, f'CH6 T {date}.log'), 'r') as f:
+            columns = list(zip(*[l.strip(' \t\r\n').split(',')[:2] for l in f.readlines()]))
+    results = {}
+    for name, decoder_type in TIMESTAMP_DECODERS.items():
+        decoder = decoder_type()
+        elapsed, results[name] = time_call(lambda: [decoder(d, t) for d, t in zip(*columns)], repeat=1)
+        print(f"{name:>10}: {rows / elapsed:>12,.0f} rows/s")
+    for name, result in results.items():
+        if result != results['strptime']:
+            print(f"{name:>10}: OUTPUT DIFFERS FROM STRPTIME")
+
+BENCHMARKS = {
+    'engines': (benchmark_engines, 20000),
+    'timestamps': (benchmark_timestamp_decoders, 1000000),
+}
+
+if __name__ == "__main__":
+    names = [sys.argv[1]] if len(sys.argv) > 1 else BENCHMARKS.keys()
+    for name in names:
+        benchmark, rows = BENCHMARKS[name]
+        print(f"--- {name} ---")
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else rows)
@@ -0,0 +1,112 @@
+# Benchmarks checking a full fridge change set against hundreds of monitors, value by value against the compiled engine
+# Run from the repository root: python tests/benchmark_monitors.py [samples per channel]
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import localvars
+from Core.valueMonitors import MONITORS, OutRangeMonitor
+from Core.monitorManager import MonitorManager
+from Core.sampleBatch import SampleBatch
+
+SUBCHANNELS = {
+    'heaters': [f'heater{i}' for i in range(40)],
+    'Status': [f'status{i}' for i in range(60)],
+    'maxigauge': [f'CH{i+1}' for i in range(6)],
+    'Channels': [f'v{i}' for i in range(24)],
+}
+SINGLE_CHANNELS = localvars.THERMOMETRY_CHANNELS + ['Flowmeter']
+
+def random_monitor(quiet):
+    """
+    :param quiet: only monitors that stay silent on values between 0 and 100, like a fridge running normally
+    """
+    if quiet:
+        name = random.choice(['InRangeMonitor', 'OutRangeMonitorInclusive', 'EqualNumber', 'WhenOff'])
+        variables = {
+            'InRangeMonitor': {'minimum': 200.0, 'maximum': 300.0},
+            'OutRangeMonitorInclusive': {'minimum': -1.0, 'maximum': 101.0},
+            'EqualNumber': {'value': -5.0},
+            'WhenOff': {},
+        }[name]
+    else:
+        name = random.choice(['InRangeMonitor', 'InRangeMonitorInclusive', 'OutRangeMonitor', 'OutRangeMonitorInclusive',
+                              'EqualNumber', 'NotEqualNumber', 'WhenOn', 'WhenOff'])
+        variables = {}
+        for variable in MONITORS[name]['variables']:
+            variables[variable] = random.choice([None, random.uniform(0, 100)]) if variable in ('minimum', 'maximum') else float(random.randint(0, 3))
+    monitor = MONITORS[name]
+    return monitor['type'], monitor['values'], variables
+
+def build_monitors(quiet, bands=1):
+    """
+    :param bands: monitors per channel or subchannel, a warning band then a critical band around it when 2
+    """
+    manager = MonitorManager(None)
+    signals = [(channel, None) for channel in SINGLE_CHANNELS] + [(channel, subchannel) for channel, subchannels in SUBCHANNELS.items() for subchannel in subchannels]
+    for channel, subchannel in signals:
+        if bands == 1:
+            manager.addMonitor(channel, subchannel, *random_monitor(quiet))
+            continue
+        low, high = (0.0, 100.0) if quiet else sorted([random.uniform(0, 100), random.uniform(0, 100)])
+        for band, severity in zip(range(bands), ['warning', 'critical', 'info']):
+            width = 10.0 * band
+            manager.addMonitor(channel, subchannel, OutRangeMonitor, {'inclusive': True}, {'minimum': low - width, 'maximum': high + width},
+                               monitor_id=f"{channel}:{subchannel}:{severity}", severity=severity)
+    return manager
+
+def build_changes(samples):
+    changes = {}
+    times = [1717372800.0 + i for i in range(samples)]
+    for channel in SINGLE_CHANNELS:
+        changes[channel] = SampleBatch(times, [random.uniform(0.1, 100) for _ in times])
+    for channel, subchannels in SUBCHANNELS.items():
+        changes[channel] = SampleBatch(times, [{s: random.choice([random.uniform(0.1, 100), random.randint(1, 3)]) for s in subchannels} for _ in times])
+    return changes
+
+def check_value_by_value(manager, changes):
+    # The engine checkMonitors used before monitors were compiled
+    ret = {}
+    for channel, batch in changes.items():
+        if channel not in manager.monitors:
+            continue
+        for subchannel, monitors in manager.monitors[channel].items():
+            if subchannel is None:
+                column = batch.values
+            else:
+                column = [v for v in batch.column(subchannel) if v is not None]
+            if len(column):
+                for monitor_id, monitor in monitors.items():
+                    ret[monitor_id] = any(map(monitor.checkValue, column))
+    return ret
+
+def time_call(function, changes, repeat=100):
+    best = float('inf')
+    for _ in range(repeat):
+        for batch in changes.values():
+            batch._columns = {} # Every change set arrives as new batches
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == "__main__":
+    samples_per_channel = [int(sys.argv[1])] if len(sys.argv) > 1 else [1, 10, 100]
+    for quiet, bands in ((True, 1), (False, 1), (True, 2), (False, 2)):
+        for samples in samples_per_channel:
+            random.seed(0)
+            manager = build_monitors(quiet, bands)
+            changes = build_changes(samples)
+            monitor_count = len(manager.signals)
+            result = manager.checkMonitors(changes)
+            assert result == check_value_by_value(manager, changes)
+            triggered = len(MonitorManager.WhatMonitorsTriggered(result))
+            value_by_value = time_call(lambda: check_value_by_value(manager, changes), changes)
+            compiled = time_call(lambda: manager.checkMonitors(changes), changes)
+            print(f"{'quiet' if quiet else 'random'} monitors, {bands} per signal: {monitor_count} monitors ({triggered} triggered), "
+                  f"{len(changes)} channels, {samples} samples per channel")
+            print(f"    value by value: {value_by_value * 1e6:9.1f} us")
+            print(f"    compiled:       {compiled * 1e6:9.1f} us ({value_by_value / compiled:.1f}x)")
@@ -71,23 +71,30 @@ def channel_channel(date_str, time_str, keys=['one', 'two', 'three']):
 def very_large_channel(date_str, time_str):
     s = "abcdefghijklmnopqrstuvwxyz"
     return kv_channel(date_str, time_str, keys=[c for c in s])
-LOG_PATH = 'test_logs'
-logging_threads = []
-#logging_threads.append(threading.Thread(target=generate_logs, args=('CH1 T',LOG_PATH,single_channel)))
-#logging_threads.append(threading.Thread(target=generate_logs, args=('CH1 P',LOG_PATH,single_channel)))
-#logging_threads.append(threading.Thread(target=generate_logs, args=('CH1 R',LOG_PATH,single_channel)))
-logging_threads.append(threading.Thread(target=generate_multiple_logs, args=(['CH1 R','CH1 T','CH1 P'],LOG_PATH,single_channel)))
-logging_threads.append(threading.Thread(target=generate_logs, args=('Flowmeter',LOG_PATH,single_channel)))
-logging_threads.append(threading.Thread(target=generate_logs, args=('Channels',LOG_PATH,channel_channel)))
-logging_threads.append(threading.Thread(target=generate_logs, args=('Status',LOG_PATH,kv_channel)))
-logging_threads.append(threading.Thread(target=generate_logs, args=('heaters',LOG_PATH,very_large_channel)))
-
-for thread in logging_threads:
-    thread.daemon = True
-    thread.start()
-
-try:
-    while True:
-        time.sleep(10)
-except KeyboardInterrupt:
-    print("Program terminated.")
\ No newline at end of file
+
+def maxigauge_channel(date_str, time_str, gauges=6):
+    # name, padding, enabled, pressure, state, power for every gauge
+    return [date_str, time_str] + sum([[f'CH{i+1}', '       ', 1, random.random()*1000, 0, 1] for i in range(gauges)], [])
+
+
+if __name__ == "__main__":
+    LOG_PATH = 'test_logs'
+    logging_threads = []
+    #logging_threads.append(threading.Thread(target=generate_logs, args=('CH1 T',LOG_PATH,single_channel)))
+    #logging_threads.append(threading.Thread(target=generate_logs, args=('CH1 P',LOG_PATH,single_channel)))
+    #logging_threads.append(threading.Thread(target=generate_logs, args=('CH1 R',LOG_PATH,single_channel)))
+    logging_threads.append(threading.Thread(target=generate_multiple_logs, args=(['CH1 R','CH1 T','CH1 P'],LOG_PATH,single_channel)))
+    logging_threads.append(threading.Thread(target=generate_logs, args=('Flowmeter',LOG_PATH,single_channel)))
+    logging_threads.append(threading.Thread(target=generate_logs, args=('Channels',LOG_PATH,channel_channel)))
+    logging_threads.append(threading.Thread(target=generate_logs, args=('Status',LOG_PATH,kv_channel)))
+    logging_threads.append(threading.Thread(target=generate_logs, args=('heaters',LOG_PATH,very_large_channel)))
+
+    for thread in logging_threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        while True:
+            time.sleep(10)
+    except KeyboardInterrupt:
+        print("Program terminated.")
\ No newline at end of file
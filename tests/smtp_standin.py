@@ -0,0 +1,120 @@
+# Sends alerts through the mail queue to a local SMTP stand-in, checking batching, connection reuse, reconnects and retries
+# Run from the repository root: python tests/smtp_standin.py
+# Uses aiosmtpd when installed, otherwise the standard library smtpd (Python 3.11 and older)
+import os
+import sys
+import time
+import socket
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Core.mailQueue import MailQueue
+from Core.mailer import Mailer
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class StandIn:
+    """
+    Local SMTP server keeping every received email
+    """
+    def __init__(self, port):
+        self.port = port
+        self.received = []  # (recipients, message)
+        self._server = None
+
+    def start(self):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            return self._start_smtpd()
+        stand_in = self
+        class Handler:
+            async def handle_DATA(self, server, session, envelope):
+                stand_in.received.append((envelope.rcpt_tos, envelope.content.decode('utf-8', 'replace')))
+                return '250 OK'
+        self._server = Controller(Handler(), hostname='127.0.0.1', port=self.port)
+        self._server.start()
+        self._stop = self._server.stop
+
+    def _start_smtpd(self):
+        import warnings
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import asyncore
+        import smtpd
+        stand_in = self
+        class Server(smtpd.SMTPServer):
+            def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+                stand_in.received.append((rcpttos, data.decode('utf-8', 'replace') if type(data) == bytes else data))
+        self._server = Server(('127.0.0.1', self.port), None)
+        self._map = asyncore.socket_map
+        running = threading.Event()
+        running.set()
+        def loop():
+            while running.is_set():
+                asyncore.loop(timeout=0.05, count=1)
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        def stop():
+            running.clear()
+            thread.join()
+            for channel in list(self._map.values()):
+                channel.close() # Also drops open client connections, like a server restart
+        self._stop = stop
+
+    def stop(self):
+        self._stop()
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+if __name__ == "__main__":
+    port = free_port()
+    server = StandIn(port)
+    server.start()
+    mail_queue = MailQueue(use_ssl=False, batch_seconds=0.3, idle_seconds=60, retries=4, retry_seconds=0.2, retry_max_seconds=1)
+    mail_queue.start()
+    mailer = Mailer(['fridge@example.com'], email='monitor@example.com', password='', smtp_server='127.0.0.1', smtp_port=port, mail_queue=mail_queue)
+    status = {'CH6 T': (time.time(), 0.012)}
+
+    # Queuing returns at once, whatever the network does
+    start = time.perf_counter()
+    mailer.send_alert({'CH6 T': {'currentValue': [(time.time(), 0.05)], 'monitor': 'in range 0.02 <= value <= inf (critical)', 'severity': 'critical'}}, status)
+    for i in range(4):
+        mailer.send_alert({}, status, resolved=[f"CH{i + 1} T is no longer in range"])
+    print(f"5 alerts queued in {(time.perf_counter() - start) * 1e3:.2f} ms")
+    assert wait_for(lambda: len(server.received) == 1)
+    time.sleep(0.5)
+    print(f"batched into {len(server.received)} email: {mail_queue.batched} merged, subject: "
+          f"{[l for l in server.received[0][1].splitlines() if l.startswith('Subject')][0]}")
+    assert len(server.received) == 1 and 'CRITICAL' in server.received[0][1]
+
+    # The connection stays open for the next email
+    mailer.send_test(status)
+    assert wait_for(lambda: len(server.received) == 2)
+    print(f"second email over the same connection: {mail_queue.connections} connection(s)")
+    assert mail_queue.connections == 1
+
+    # Server restart: the dropped connection is reopened, and emails sent while it is down are retried with backoff
+    server.stop()
+    mailer.send_test(status)
+    time.sleep(0.8)
+    server = StandIn(port)
+    server.start()
+    assert wait_for(lambda: mail_queue.sent == 3)
+    print(f"sent after the server came back: {mail_queue.connections} connection(s), {mail_queue.failed} failed")
+    assert mail_queue.failed == 0 and len(server.received) == 1
+
+    mailer.stop()
+    server.stop()
+    print("ok")
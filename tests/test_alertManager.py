@@ -0,0 +1,166 @@
+import pytest
+import Core.alertManager as alertManager
+from Core.alertManager import AlertState, AlertManager, OK, PENDING, FIRING, TRIGGERED, ESCALATED, RENOTIFY, CLEARED
+from Core.monitorManager import MonitorManager
+from Core.sampleBatch import SampleBatch
+from Core.valueMonitors import OutRangeMonitor, InRangeMonitor, MONITORS
+
+
+@pytest.fixture(autouse=True)
+def alert_times(monkeypatch):
+    # Fixed times, whatever the local configuration says
+    monkeypatch.setattr(alertManager, 'ALERT_DEBOUNCE_SECONDS', 10)
+    monkeypatch.setattr(alertManager, 'ALERT_CLEAR_SECONDS', 60)
+    monkeypatch.setattr(alertManager, 'ALERT_RENOTIFY_SECONDS', 0)
+    monkeypatch.setattr(alertManager, 'ALERT_ESCALATION_SECONDS', 0)
+    monkeypatch.setattr(alertManager, 'ALERT_CLEAR_MARGIN', 0.05)
+
+
+def fire(alert, now):
+    """
+    Triggers the alert until it fires
+
+    :return: time it fired at
+    """
+    alert.update(True, now)
+    now += alertManager.ALERT_DEBOUNCE_SECONDS
+    assert alert.update(True, now) == TRIGGERED
+    return now
+
+
+def clear(alert, now):
+    """
+    Keeps the alert quiet until it clears
+
+    :return: time it cleared at
+    """
+    alert.update(False, now)
+    now += alertManager.ALERT_CLEAR_SECONDS
+    assert alert.update(False, now) == CLEARED
+    return now
+
+
+def test_clear_resets_escalation(monkeypatch):
+    monkeypatch.setattr(alertManager, 'ALERT_ESCALATION_SECONDS', 100)
+    alert = AlertState(OutRangeMonitor(None, 1.0), 'info')
+    now = fire(alert, 0)
+    assert alert.update(True, now + 100) == ESCALATED
+    assert alert.severity == 'warning'
+
+    now = clear(alert, now + 100)
+    assert alert.state == OK
+    assert alert.severity == 'info' and alert.escalations == 0
+
+    # Fires again at its own severity, and escalates a whole escalation time after that
+    now = fire(alert, now + 1)
+    assert alert.state == FIRING and alert.severity == 'info'
+    assert alert.update(True, now + 99) is None
+    assert alert.update(True, now + 100) == ESCALATED
+    assert alert.severity == 'warning'
+
+
+def test_debounce():
+    alert = AlertState(OutRangeMonitor(None, 1.0), 'warning')
+    assert alert.update(True, 0) is None
+    assert alert.state == PENDING
+    assert alert.update(True, 9) is None
+    assert alert.update(False, 9.5) is None # Too short to alert
+    assert alert.state == OK
+    assert alert.update(True, 20) is None
+    assert alert.update(None, 30) == TRIGGERED # No new samples, the last result holds
+    assert alert.state == FIRING
+
+
+def test_clear_needs_a_quiet_clear_time():
+    alert = AlertState(OutRangeMonitor(None, 1.0), 'warning')
+    now = fire(alert, 0)
+    assert alert.update(False, now + 1) is None
+    assert alert.update(True, now + 50) is None # Triggered again before the clear time, still the same alert
+    assert alert.update(False, now + 51) is None
+    assert alert.update(False, now + 110) is None
+    assert alert.update(None, now + 111) == CLEARED
+    assert alert.state == OK
+
+
+def test_renotify_and_escalation_up_to_the_top_severity(monkeypatch):
+    monkeypatch.setattr(alertManager, 'ALERT_ESCALATION_SECONDS', 100)
+    monkeypatch.setattr(alertManager, 'ALERT_RENOTIFY_SECONDS', 30)
+    alert = AlertState(OutRangeMonitor(None, 1.0), 'info')
+    now = fire(alert, 0)
+    transitions = [(t, alert.update(True, now + t)) for t in range(1, 301)]
+    transitions = [(t, kind) for t, kind in transitions if kind is not None]
+    assert transitions == [(30, RENOTIFY), (60, RENOTIFY), (90, RENOTIFY), (100, ESCALATED), (130, RENOTIFY),
+                           (160, RENOTIFY), (190, RENOTIFY), (200, ESCALATED), (230, RENOTIFY), (260, RENOTIFY),
+                           (290, RENOTIFY)]
+    assert alert.severity == 'critical' and alert.escalations == 2
+
+
+def test_hold_monitors():
+    assert InRangeMonitor(1.0, 2.0).holding(0.1).checkValue(0.95)
+    assert not InRangeMonitor(1.0, 2.0).holding(0.1).checkValue(0.85)
+    assert OutRangeMonitor(-2.0, 2.0).holding(0.1).checkValue(1.9)
+    assert not OutRangeMonitor(-2.0, 2.0).holding(0.1).checkValue(1.7)
+    hold = OutRangeMonitor(1.0, 1.01).holding(0.1) # Margins wider than the range meet in the middle
+    assert hold.minimum == hold.maximum
+
+
+class Mailer:
+    def __init__(self):
+        self.sent = []
+
+    def send_alert(self, triggered, all_values, resolved=()):
+        self.sent.append((list(triggered), list(resolved)))
+
+
+def manager_with_monitor(monitor_type='OutRangeMonitor', variables={'minimum': None, 'maximum': 1.0}, severity='warning'):
+    monitors = MonitorManager(None)
+    monitors.addMonitor('CH6 T', None, MONITORS[monitor_type]['type'], MONITORS[monitor_type]['values'], variables,
+                        monitor_id='hot', severity=severity)
+    return monitors, AlertManager(monitors, Mailer())
+
+
+def feed(monitors, alerts, values, start, step=20):
+    """
+    :return: [(time, transitions)] of the updates that changed an alert
+    """
+    ret = []
+    for i, value in enumerate(values):
+        t = start + i * step
+        batch = {'CH6 T': SampleBatch([t], [value])}
+        transitions = alerts.process(batch, monitors.checkMonitors(batch), lambda: {}, now=t)
+        if transitions:
+            ret.append((t, transitions))
+    return ret
+
+
+def test_clear_margin_keeps_one_alert_at_the_threshold():
+    monitors, alerts = manager_with_monitor()
+    assert feed(monitors, alerts, [1.01] * 3, 0) == [(20, {'hot': TRIGGERED})]
+    # Wavering around the threshold, inside the margin: the alert neither clears nor fires again
+    assert feed(monitors, alerts, [0.99, 1.01] * 20, 60) == []
+    # Back below the threshold by more than the margin
+    changes = feed(monitors, alerts, [0.9] * 6, 860)
+    assert changes == [(920, {'hot': CLEARED})]
+    assert alerts.mailer.sent == [(['CH6 T'], []), ([], ['CH6 T is no longer out of range -inf < value < 1.0 (hot)'])]
+
+
+def test_without_clear_margin_the_alert_clears_between_crossings(monkeypatch):
+    monkeypatch.setattr(alertManager, 'ALERT_CLEAR_MARGIN', 0)
+    monitors, alerts = manager_with_monitor()
+    feed(monitors, alerts, [1.01] * 3, 0)
+    changes = feed(monitors, alerts, [0.99] * 4 + [1.01] * 2, 60)
+    assert [kinds for _, kinds in changes] == [{'hot': CLEARED}, {'hot': TRIGGERED}]
+
+
+def test_removed_and_edited_monitors():
+    monitors, alerts = manager_with_monitor()
+    feed(monitors, alerts, [1.01] * 3, 0)
+    assert alerts.firing() == ['hot']
+    # An edit is a new monitor object, its alert starts over
+    monitors.addMonitor('CH6 T', None, MONITORS['OutRangeMonitor']['type'], MONITORS['OutRangeMonitor']['values'],
+                        {'minimum': None, 'maximum': 2.0}, monitor_id='hot')
+    alerts.update({}, now=100)
+    assert alerts.firing() == []
+    monitors.removeMonitor('CH6 T', None, monitor_id='hot')
+    alerts.update({}, now=120)
+    assert alerts.alerts == {}
@@ -0,0 +1,147 @@
+import time
+import threading
+import pytest
+import Core.fileManager as fileManager
+from Core.fileManager import FileManager
+from Core.changeQueue import CoalescingChangeQueue
+
+
+def test_same_file_coalesces_in_first_arrival_order():
+    changes = CoalescingChangeQueue()
+    changes.put('modified', 'CH6 T', '24-06-03')
+    changes.put('modified', 'Status', '24-06-03')
+    changes.put('modified', 'CH6 T', '24-06-03')
+    changes.put('modified', 'CH6 T', '24-06-04') # Another day is another file
+    assert len(changes) == 3
+    assert changes.drain() == [('modified', 'CH6 T', '24-06-03'), ('modified', 'Status', '24-06-03'),
+                               ('modified', 'CH6 T', '24-06-04')]
+    assert changes.received == 4 and changes.coalesced == 1
+    assert len(changes) == 0 and changes.drain() == []
+
+
+def test_created_wins():
+    changes = CoalescingChangeQueue()
+    changes.put('modified', 'CH6 T', '24-06-03')
+    changes.put('created', 'CH6 T', '24-06-03')
+    changes.put('modified', 'CH6 T', '24-06-03')
+    assert changes.drain() == [('created', 'CH6 T', '24-06-03')]
+
+
+def test_wait():
+    changes = CoalescingChangeQueue()
+    assert not changes.wait(0.01)
+    changes.put('modified', 'CH6 T', '24-06-03')
+    assert changes.wait(0.01)
+    changes.drain()
+    assert not changes.wait(0.01) # Draining clears it
+
+    waiter = threading.Thread(target=changes.wait)
+    waiter.start()
+    changes.wake()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert changes.drain() == [] # Woken without a change
+
+
+class Collector:
+    """
+    Just what FileManager.collectBatch uses, with changeDetected recording the reads
+    """
+    readPendingChanges = FileManager.readPendingChanges
+    collectBatch = FileManager.collectBatch
+
+    def __init__(self):
+        self.changeQueue = CoalescingChangeQueue()
+        self._isRunning = True
+        self.read = []
+
+    def changeDetected(self, change, channel, date):
+        self.read.append(channel)
+
+
+@pytest.fixture
+def batch_times(monkeypatch):
+    # Wide margins, the changes are fed from another thread on a possibly busy machine
+    monkeypatch.setattr(fileManager, 'CHANGE_QUIET_PERIOD', 0.3)
+    monkeypatch.setattr(fileManager, 'CHANGE_MAX_LATENCY', 2)
+    monkeypatch.setattr(fileManager, 'CHANGE_MAX_BATCH', 200)
+    return monkeypatch
+
+
+def feed(collector, interval, distinct=True):
+    """
+    Puts a change every interval seconds until the returned event is set
+    """
+    stop = threading.Event()
+
+    def run():
+        i = 0
+        while not stop.wait(interval):
+            collector.changeQueue.put('modified', f'CH{i} T' if distinct else 'CH6 T', '24-06-03')
+            i += 1
+    threading.Thread(target=run, daemon=True).start()
+    return stop
+
+
+def collect(collector):
+    start = time.monotonic()
+    collector.collectBatch()
+    return time.monotonic() - start
+
+
+def test_batch_ends_once_quiet(batch_times):
+    collector = Collector()
+    collector.changeQueue.put('modified', 'CH6 T', '24-06-03')
+    elapsed = collect(collector)
+    assert collector.read == ['CH6 T']
+    assert 0.25 <= elapsed < 1.5
+
+
+def test_batch_gathers_a_burst(batch_times):
+    collector = Collector()
+    collector.changeQueue.put('modified', 'Status', '24-06-03')
+    stop = feed(collector, 0.02)
+    time.sleep(0.5)
+    stop.set()
+    collect(collector)
+    assert collector.read[0] == 'Status' and len(collector.read) > 5
+    assert len(collector.changeQueue) == 0
+
+
+def test_batch_ends_at_max_latency(batch_times):
+    collector = Collector()
+    collector.changeQueue.put('modified', 'Status', '24-06-03')
+    stop = feed(collector, 0.05, distinct=False) # Never quiet
+    try:
+        elapsed = collect(collector)
+    finally:
+        stop.set()
+    assert 2 <= elapsed < 3.5
+    assert collector.read[0] == 'Status' and len(collector.read) > 2
+
+
+def test_batch_ends_at_max_reads(batch_times):
+    batch_times.setattr(fileManager, 'CHANGE_MAX_LATENCY', 30)
+    batch_times.setattr(fileManager, 'CHANGE_MAX_BATCH', 5)
+    collector = Collector()
+    collector.changeQueue.put('modified', 'Status', '24-06-03')
+    stop = feed(collector, 0.05)
+    try:
+        elapsed = collect(collector)
+    finally:
+        stop.set()
+    assert 5 <= len(collector.read) < 10
+    assert elapsed < 5
+
+
+def test_batch_ends_when_stopped(batch_times):
+    batch_times.setattr(fileManager, 'CHANGE_MAX_LATENCY', 30)
+    collector = Collector()
+    collector.changeQueue.put('modified', 'Status', '24-06-03')
+    stop = feed(collector, 0.05)
+    threading.Timer(0.5, lambda: setattr(collector, '_isRunning', False)).start()
+    try:
+        elapsed = collect(collector)
+    finally:
+        stop.set()
+    assert elapsed < 5
@@ -0,0 +1,112 @@
+import os
+from datetime import timedelta
+import pytest
+import Core.logArchive as logArchive
+from Core.logArchive import ArchiveFile, LogArchive, write_archive_file
+from Core.fileReader import read_log_file
+from Core.fileUtilities import log_file_name
+from benchmark_file_reader import BENCHMARK_CHANNELS, DATE, write_synthetic_log
+
+ROWS = 500
+
+
+@pytest.mark.parametrize('channel', BENCHMARK_CHANNELS.keys())
+def test_round_trip(tmp_path, channel):
+    date = write_synthetic_log(str(tmp_path), channel, BENCHMARK_CHANNELS[channel], ROWS)
+    data, labels = read_log_file(channel, date, log_path=str(tmp_path), use_cache=False)
+    source_stat = os.stat(tmp_path / date / log_file_name(channel, date))
+    fname = str(tmp_path / 'archive' / f'{channel}.col')
+    write_archive_file(fname, data, labels, source_stat)
+
+    archive = ArchiveFile(fname)
+    try:
+        assert archive.rows == ROWS
+        assert archive.is_current(source_stat)
+        assert archive.read() == (data, labels)
+        # Values keep their type: ints do not come back as floats
+        assert [type(v) for v in archive.read()[0].values()] == [type(v) for v in data.values()]
+    finally:
+        archive.close()
+
+
+def test_empty_file(tmp_path):
+    fname = str(tmp_path / 'empty.col')
+    write_archive_file(fname, {}, [])
+    archive = ArchiveFile(fname)
+    assert archive.read() == ({}, [])
+    archive.close()
+
+
+def test_missing_subchannels(tmp_path):
+    data = {1.0: {'a': 1.5, 'b': 2}, 2.0: {'a': 2.5}, 3.0: {'b': 3, 'c': 'on'}}
+    fname = str(tmp_path / 'sparse.col')
+    write_archive_file(fname, data, ['a', 'b', 'c'])
+    archive = ArchiveFile(fname)
+    assert archive.subchannels() == ['a', 'b', 'c']
+    assert archive.read() == (data, ['a', 'b', 'c'])
+    archive.close()
+
+
+def write_days(log_path, days, channels=('CH6 T', 'Status')):
+    for day in range(days):
+        for channel in channels:
+            write_synthetic_log(log_path, channel, BENCHMARK_CHANNELS[channel], 100, start=DATE + timedelta(days=day))
+    return [(DATE + timedelta(days=day)).strftime(logArchive.DATE_FORMAT) for day in range(days)]
+
+
+def test_compact_and_read(tmp_path):
+    log_path = str(tmp_path / 'logs')
+    dates = write_days(log_path, 3)
+    archive = LogArchive(log_path, str(tmp_path / 'archive'))
+    assert archive.compact() == 4 # The newest day is still being written
+    assert archive.high_water == dates[1]
+    for date in dates[:2]:
+        assert archive.open('CH6 T', date) is not None
+        assert archive.read('Status', date) == read_log_file('Status', date, log_path=log_path, use_cache=False)
+    assert archive.open('CH6 T', dates[2]) is None
+    assert archive.read('CH6 T', dates[2]) == read_log_file('CH6 T', dates[2], log_path=log_path, use_cache=False)
+
+    # Nothing left to do, and the index is picked up again by a new archive
+    again = LogArchive(log_path, str(tmp_path / 'archive'))
+    assert again.compact() == 0
+    assert again.high_water == dates[1]
+
+
+def test_changed_log_file_is_not_current(tmp_path):
+    log_path = str(tmp_path / 'logs')
+    dates = write_days(log_path, 2)
+    archive = LogArchive(log_path, str(tmp_path / 'archive'))
+    archive.compact()
+    with open(os.path.join(log_path, dates[0], log_file_name('CH6 T', dates[0])), 'a') as f:
+        f.write('03-06-24,23:59:59,1.5\n')
+    assert archive.open('CH6 T', dates[0]) is None
+    assert archive.read('CH6 T', dates[0]) == read_log_file('CH6 T', dates[0], log_path=log_path, use_cache=False)
+    assert archive.compact_file('CH6 T', dates[0])
+    assert archive.open('CH6 T', dates[0]) is not None
+
+
+def test_failed_folder_is_retried(tmp_path, monkeypatch):
+    log_path = str(tmp_path / 'logs')
+    dates = write_days(log_path, 4)
+    archive = LogArchive(log_path, str(tmp_path / 'archive'))
+
+    def failing_read(channel, date, **kwargs):
+        if (channel, date) == ('Status', dates[1]):
+            raise OSError('locked')
+        return read_log_file(channel, date, **kwargs)
+    monkeypatch.setattr(logArchive, 'read_log_file', failing_read)
+    assert archive.compact() == 5
+    assert archive.high_water == dates[0] # Not past the folder that failed, even though later ones were archived
+
+    monkeypatch.setattr(logArchive, 'read_log_file', read_log_file)
+    assert archive.compact() == 1
+    assert archive.high_water == dates[2]
+    assert archive.open('Status', dates[1]) is not None
+
+
+def test_stop(tmp_path):
+    log_path = str(tmp_path / 'logs')
+    write_days(log_path, 3)
+    archive = LogArchive(log_path, str(tmp_path / 'archive'))
+    assert archive.compact(should_stop=lambda: True) == 0
+    assert archive.high_water is None
@@ -0,0 +1,125 @@
+import time
+import smtplib
+import pytest
+import Core.mailQueue as mailQueue
+from Core.mailQueue import MailMessage, MailQueue
+
+
+class FakeSMTP:
+    """
+    Records what is sent. failures is a list of exceptions raised by the next sendmail calls, in order
+    """
+    opened = []
+    failures = []
+
+    def __init__(self, server, port, timeout=None):
+        self.server, self.port = server, port
+        self.sent = []
+        self.closed = False
+        FakeSMTP.opened.append(self)
+
+    def login(self, user, password):
+        pass
+
+    def sendmail(self, sender, recipients, message):
+        assert not self.closed
+        if FakeSMTP.failures:
+            raise FakeSMTP.failures.pop(0)
+        self.sent.append((sender, list(recipients), message))
+
+    def quit(self):
+        self.closed = True
+
+    close = quit
+
+
+@pytest.fixture(autouse=True)
+def smtp(monkeypatch):
+    FakeSMTP.opened, FakeSMTP.failures = [], []
+    monkeypatch.setattr(mailQueue.smtplib, 'SMTP', FakeSMTP)
+    return FakeSMTP
+
+
+def message(subject, recipients=('a@example.com',), priority=0, server='smtp.example.com'):
+    return MailMessage(subject, f"body of {subject}", 'me@example.com', recipients, 'secret', server, 25, priority)
+
+
+def run_queue(messages, delivered=0, **kwargs):
+    """
+    :param delivered: number of emails sent or dropped to wait for before stopping, since stopping gives up on retries
+    """
+    kwargs = {'use_ssl': False, 'batch_seconds': 0.5, 'idle_seconds': 60, 'retries': 2, 'retry_seconds': 0.01,
+              'retry_max_seconds': 0.02, **kwargs}
+    mails = MailQueue(**kwargs)
+    mails.start()
+    for m in messages:
+        mails.put(m)
+    deadline = time.monotonic() + 10
+    while mails.sent + mails.failed < delivered and time.monotonic() < deadline:
+        time.sleep(0.01)
+    mails.stop(timeout=10)
+    assert not mails.is_alive()
+    return mails
+
+
+def sent():
+    return [(recipients, body) for connection in FakeSMTP.opened for _, recipients, body in connection.sent]
+
+
+def test_batches_by_recipients():
+    mails = run_queue([message('first'), message('urgent', priority=2), message('other', recipients=['b@example.com']),
+                       message('last')])
+    assert mails.sent == 2 and mails.batched == 2 and mails.failed == 0
+    (to_a, batch), (to_b, single) = sent()
+    assert to_a == ['a@example.com'] and to_b == ['b@example.com']
+    assert 'Subject: urgent (+2 more)' in batch
+    assert batch.index('body of first') < batch.index('body of urgent') < batch.index('body of last')
+    assert 'Subject: other' in single and 'more)' not in single
+
+
+def test_reuses_the_connection():
+    mails = run_queue([message('one'), message('two', recipients=['b@example.com'])], batch_seconds=0)
+    assert mails.sent == 2 and mails.connections == 1
+    assert len(FakeSMTP.opened) == 1 and FakeSMTP.opened[0].closed
+
+
+def test_account_change_reconnects():
+    mails = run_queue([message('one'), message('two', server='other.example.com')])
+    assert mails.sent == 2 and mails.connections == 2
+    assert [c.server for c in FakeSMTP.opened] == ['smtp.example.com', 'other.example.com']
+
+
+def test_reconnects_when_the_server_dropped_the_connection():
+    mails = MailQueue(use_ssl=False, batch_seconds=0, retries=0)
+    mails._deliver(message('one'))
+    FakeSMTP.failures = [smtplib.SMTPServerDisconnected('gone')]
+    assert mails._deliver(message('two')) # Not a failure of the email, even without retries
+    assert mails.sent == 2 and mails.failed == 0 and mails.connections == 2
+    assert FakeSMTP.opened[0].closed and len(FakeSMTP.opened[1].sent) == 1
+    mails._disconnect()
+
+
+def test_retries_then_sends():
+    FakeSMTP.failures = [smtplib.SMTPException('busy'), smtplib.SMTPException('busy')]
+    mails = run_queue([message('one')], delivered=1)
+    assert mails.sent == 1 and mails.failed == 0
+    assert len(FakeSMTP.opened) == 3 # A failure closes the connection, each attempt opens a new one
+    assert len(sent()) == 1
+
+
+def test_drops_after_the_last_retry():
+    FakeSMTP.failures = [smtplib.SMTPException('busy')] * 3
+    mails = run_queue([message('one'), message('two', recipients=['b@example.com'])], delivered=2)
+    assert mails.failed == 1 and mails.sent == 1
+    assert [recipients for recipients, _ in sent()] == [['b@example.com']]
+
+
+def test_stop_sends_what_is_queued_without_waiting_for_the_batch():
+    mails = MailQueue(use_ssl=False, batch_seconds=60)
+    mails.start()
+    mails.put(message('one'))
+    mails.put(message('two'))
+    mails.stop(timeout=10)
+    assert not mails.is_alive()
+    assert mails.sent == 1 and mails.batched == 1
+    assert 'Subject: one (+1 more)' in sent()[0][1]
@@ -0,0 +1,40 @@
+import math
+from Core.sampleStore import ChannelStore
+
+
+def test_dict_sample_on_scalar_channel_is_rejected():
+    store = ChannelStore(10)
+    store.append(1.0, 1.5)
+    store.append(2.0, {'a': 1.0})
+    store.extend([(3.0, 2.5), (4.0, {'b': 2.0})])
+    assert list(store) == [(1.0, 1.5), (3.0, 2.5)]
+    assert store.rejected == 2
+    assert not store.has_subchannels
+    assert store.latest() == (3.0, 2.5)
+
+
+def test_scalar_sample_on_subchannel_channel_is_rejected():
+    store = ChannelStore(10)
+    store.extend([(1.0, {'a': 1.0, 'b': 2}), (2.0, {'a': 3.0, 'b': 4})])
+    store.append(3.0, 5.0)
+    store.extend([(4.0, 6.0), (5.0, {'a': 7.0, 'b': 8})])
+    assert list(store) == [(1.0, {'a': 1.0, 'b': 2}), (2.0, {'a': 3.0, 'b': 4}), (5.0, {'a': 7.0, 'b': 8})]
+    assert store.rejected == 2
+    assert store.last_time == 5.0
+
+
+def test_mixed_first_batch_keeps_the_shape_of_its_first_sample():
+    store = ChannelStore(10)
+    store.extend([(1.0, 1.0), (2.0, {'a': 1.0}), (3.0, 3.0)])
+    assert list(store) == [(1.0, 1.0), (3.0, 3.0)]
+    assert store.rejected == 1
+
+
+def test_prepend_rejects_other_shapes_and_keeps_the_object():
+    store = ChannelStore(10)
+    store.extend([(10.0, 1.0), (11.0, 2.0)])
+    same = store
+    store.prepend([(7.0, 0.5), (8.0, {'a': 1.0}), (9.0, math.pi), (10.0, 9.0)])
+    assert store is same
+    assert list(store) == [(7.0, 0.5), (9.0, math.pi), (10.0, 1.0), (11.0, 2.0)]
+    assert store.rejected == 1